@@ -0,0 +1,43 @@
+"""Conversion of samples to a table in one and in several processes
+
+Run with `python -m benchmarks.bench_parallel [n_samples]`; samples are
+converted with 1, 2, 4, ... processes up to the number of cores. The fork
+server is started before timing, and the time of encoding shards as JSON in
+the parent is shown separately, as it is not spread over the processes.
+"""
+import json
+import os
+import sys
+import time
+
+from orangecontrib.vaccinesurvey.parallel import to_orange_table_parallel
+from orangecontrib.vaccinesurvey.resolwe import TableBuilder, sample_descriptor
+from .synthetic import make_samples
+
+
+def main(n):
+    samples = make_samples(n)
+    start = time.perf_counter()
+    builder = TableBuilder(n)
+    builder.extend(sample_descriptor(sample) for sample in samples)
+    builder.table()
+    serial = time.perf_counter() - start
+    print('{} samples, {} cores'.format(n, os.cpu_count()))
+    print('{:>10} {:>10} {:>8}'.format('processes', 'time [s]', 'speedup'))
+    print('{:>10} {:>10.2f} {:>8}'.format('serial', serial, '1.0x'))
+    start = time.perf_counter()
+    json.dumps([sample_descriptor(sample) for sample in samples])
+    encoding = time.perf_counter() - start
+    print('{:>10} {:>10.2f} {:>7.1f}x'.format('encoding', encoding, serial / encoding))
+    processes = 1
+    while processes <= (os.cpu_count() or 1):
+        to_orange_table_parallel(samples[:processes], processes)  # start the fork server and import in workers
+        start = time.perf_counter()
+        to_orange_table_parallel(samples, processes)
+        elapsed = time.perf_counter() - start
+        print('{:>10} {:>10.2f} {:>7.1f}x'.format(processes, elapsed, serial / elapsed))
+        processes *= 2
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
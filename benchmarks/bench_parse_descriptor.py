@@ -0,0 +1,61 @@
+"""Per-row cost of parsing sample descriptors
+
+Compares the original per-field parser with the compiled schema parser and
+with appending rows to TableBuilder (parsing and conversion to codes/floats).
+Run with `python -m benchmarks.bench_parse_descriptor [n_samples]`.
+"""
+import sys
+import timeit
+
+from Orange.data import DiscreteVariable, TimeVariable
+
+from orangecontrib.vaccinesurvey.resolwe import DATA, METAS, SCHEMA_SLUG, TableBuilder
+from orangecontrib.vaccinesurvey.schema import get_schema
+from .synthetic import make_samples
+
+
+def parse_reference(descriptor):
+    """The parser before schemas were compiled."""
+    data = []
+    for var in DATA:
+        value = None
+        if 'group' in var[1]:
+            if descriptor.get(var[1]['group'], None):
+                value = descriptor[var[1]['group']][var[0]]
+        else:
+            value = descriptor.get(var[0], None)
+
+        if value is not None and var[1]['type'] in [DiscreteVariable, TimeVariable] and not isinstance(value, bool):
+            value = str(value)
+
+        data.append(value)
+
+    metas = [descriptor.get(var[0], None) for var in METAS]
+    return data + metas
+
+
+def per_row(func, descriptors, repeat=5):
+    """Return best time per row in microseconds."""
+    def run():
+        for descriptor in descriptors:
+            func(descriptor)
+    return min(timeit.repeat(run, number=1, repeat=repeat)) / len(descriptors) * 1e6
+
+
+def main(n):
+    descriptors = [sample.descriptor['sample'] for sample in make_samples(n)]
+    schema = get_schema(SCHEMA_SLUG)
+    assert all(schema.parse(d) == parse_reference(d) for d in descriptors)
+
+    results = [
+        ('reference parser', per_row(parse_reference, descriptors)),
+        ('compiled schema parser', per_row(schema.parse, descriptors)),
+        ('compiled schema values', per_row(schema.values, descriptors)),
+        ('TableBuilder.append', per_row(TableBuilder(n).append, descriptors, repeat=1)),
+    ]
+    for name, us in results:
+        print('{:<24} {:>8.2f} us/row'.format(name, us))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,142 @@
+"""End-to-end benchmark of downloading and converting samples from a local fake server
+
+For each number of samples a fake Resolwe server (see fake_server) is started
+in a separate process and each pipeline is measured in a fresh process:
+
+- `resdk`: `ResolweAPI.get_samples` (resdk objects) followed by `to_orange_table`,
+- `pages`: `ResolweAPI.get_sample_pages` parsed into `TableBuilder` page by page.
+
+Throughput, time to first row and peak memory (growth of the process' maximum
+resident set size) are printed and written to a JSON file, so results can be
+compared between versions. Run with `python -m benchmarks.bench_pipeline --help`.
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+from . import fake_server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _max_rss_mb():
+    if resource is None:
+        return float('nan')
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2 ** 20
+
+
+def _measure(pipeline, url, page_size, workers):
+    """Run pipeline in this process; return its measurements."""
+    from orangecontrib.vaccinesurvey.resolwe import ResolweAPI, TableBuilder, sample_descriptor, to_orange_table
+
+    start = time.perf_counter()
+    res = ResolweAPI(fake_server.USERNAME, fake_server.PASSWORD, url)
+    login = time.perf_counter() - start
+    rss = _max_rss_mb()
+
+    start = time.perf_counter()
+    if pipeline == 'resdk':
+        table = to_orange_table(list(res.get_samples()))
+        first_row = time.perf_counter() - start
+    else:
+        builder, first_row = None, None
+        for page in res.get_sample_pages(page_size, workers=workers):
+            if builder is None:
+                builder = TableBuilder(page['count'])
+            builder.extend(sample_descriptor(sample) for sample in page['results'])
+            if first_row is None:
+                first_row = time.perf_counter() - start
+        table = builder.table()
+    seconds = time.perf_counter() - start
+
+    return {
+        'pipeline': pipeline,
+        'samples': len(table),
+        'login_s': login,
+        'seconds': seconds,
+        'samples_per_s': len(table) / seconds,
+        'time_to_first_row_s': first_row,
+        'peak_memory_mb': _max_rss_mb() - rss,
+    }
+
+
+def measure(pipeline, url, page_size, workers):
+    """Run pipeline in a fresh process."""
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        return pool.apply(_measure, (pipeline, url, page_size, workers))
+
+
+def start_server(samples, latency, max_page_size, compress=True):
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'benchmarks.fake_server', '--samples', str(samples), '--latency', str(latency),
+         '--max-page-size', str(max_page_size), '--port', '0'] + ([] if compress else ['--no-compress']),
+        cwd=ROOT, stdout=subprocess.PIPE, universal_newlines=True)
+    return process, process.stdout.readline().strip()
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT, universal_newlines=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--pipelines', nargs='+', default=['resdk', 'pages'], choices=['resdk', 'pages'])
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds per request')
+    parser.add_argument('--page-size', type=int, default=500)
+    parser.add_argument('--max-page-size', type=int, default=1000, help='the largest page the server returns')
+    parser.add_argument('--workers', type=int, default=4, help='parallel page requests')
+    parser.add_argument('--no-compress', action='store_true', help='server does not gzip responses')
+    parser.add_argument('--output', default=None, help='JSON file with results')
+    args = parser.parse_args(argv)
+
+    results = []
+    print('{:>8} {:>8} {:>10} {:>12} {:>14} {:>10}'.format(
+        'pipeline', 'samples', 'total [s]', 'samples/s', 'first row [s]', 'peak [MB]'))
+    for size in args.sizes:
+        process, url = start_server(size, args.latency, args.max_page_size, not args.no_compress)
+        try:
+            for pipeline in args.pipelines:
+                result = measure(pipeline, url, args.page_size, args.workers)
+                results.append(result)
+                print('{pipeline:>8} {samples:>8} {seconds:>10.2f} {samples_per_s:>12.0f} '
+                      '{time_to_first_row_s:>14.3f} {peak_memory_mb:>10.1f}'.format(**result))
+        finally:
+            process.terminate()
+            process.wait()
+
+    output = args.output or os.path.join(
+        ROOT, 'benchmarks', 'results', 'pipeline-{:%Y%m%d-%H%M%S}.json'.format(datetime.datetime.now()))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({
+            'benchmark': 'pipeline',
+            'timestamp': datetime.datetime.now().isoformat(),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'parameters': {key: value for key, value in vars(args).items() if key != 'output'},
+            'results': results,
+        }, f, indent=2)
+    print('Results written to {}'.format(output))
+
+
+if __name__ == '__main__':
+    main()
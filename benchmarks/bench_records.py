@@ -0,0 +1,36 @@
+"""Memory held by downloaded samples as JSON and as compact records
+
+Samples' JSON is decoded from text, as it comes from the server, so that no
+strings are shared between samples.
+Run with `python -m benchmarks.bench_records [n_samples ...]`.
+"""
+import json
+import sys
+import tracemalloc
+
+from orangecontrib.vaccinesurvey.records import SampleRecord
+from .synthetic import make_samples
+
+
+def allocated(make):
+    """Return the object made by `make` and bytes allocated for it."""
+    tracemalloc.start()
+    obj = make()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return obj, size
+
+
+def main(sizes):
+    print('{:>8} {:>12} {:>12} {:>8}'.format('samples', 'JSON [MB]', 'records [MB]', 'ratio'))
+    for n in sizes:
+        text = json.dumps([{'id': sample.id, 'modified': '2016-01-01T10:00:00.000000Z',
+                            'descriptor': sample.descriptor} for sample in make_samples(n)])
+        samples, json_size = allocated(lambda: json.loads(text))
+        _, records_size = allocated(lambda: [SampleRecord.from_sample(sample) for sample in samples])
+        print('{:>8} {:>12.1f} {:>12.1f} {:>7.1f}x'.format(
+            n, json_size / 2 ** 20, records_size / 2 ** 20, json_size / records_size))
+
+
+if __name__ == '__main__':
+    main([int(n) for n in sys.argv[1:]] or [1000, 10000, 50000])
@@ -0,0 +1,66 @@
+"""Compare row-wise and columnar conversion of samples to Orange.data.Table and time validation of the table
+
+Run with `python -m benchmarks.bench_to_orange_table [n_samples ...]`. The row-wise
+conversion is a modified version of the original `to_orange_table` that runs on
+current Orange (see to_orange_table_rowwise).
+"""
+import sys
+import time
+
+from Orange.data import DiscreteVariable, Domain, Table
+
+from orangecontrib.vaccinesurvey.resolwe import DATA, METAS, SCHEMA_SLUG, sample_descriptor, to_orange_table
+from orangecontrib.vaccinesurvey.schema import get_schema
+from orangecontrib.vaccinesurvey.validation import validate
+from .synthetic import make_samples
+
+
+def to_orange_table_rowwise(samples):
+    """Parse data from samples to Orange.data.Table row by row, as the original `to_orange_table`.
+
+    Unlike the original, it accepts samples' JSON, and values of discrete
+    variables are strings without None, since current Orange does not allow
+    setting them after the variable is made.
+    """
+    #  Create table and fill it with sample data:
+    schema = get_schema(SCHEMA_SLUG)
+    table = []
+    for sample in samples:
+        table.append(schema.parse(sample_descriptor(sample)))
+
+    #  Create domain (header in table):
+    header = []
+    for i, var in enumerate(DATA):
+        if var[1]['type'] == DiscreteVariable:
+            # Provide all possible values for discrete variable:
+            values = set([sample[i] for sample in table]) - {None}
+            header.append(DiscreteVariable(var[0], values=[str(value) for value in values]))
+        else:
+            header.append(var[1]['type'](var[0]))
+
+    metas = [var[1]['type'].make(var[0]) for var in METAS]
+    return Table(Domain(header, metas=metas), table)
+
+
+def best_of(func, samples, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(samples)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main(sizes):
+    print('{:>8} {:>12} {:>12} {:>8} {:>14}'.format('samples', 'rows [s]', 'columnar [s]', 'speedup',
+                                                  'validation [s]'))
+    for n in sizes:
+        samples = make_samples(n)
+        rows = best_of(to_orange_table_rowwise, samples)
+        columnar = best_of(to_orange_table, samples)
+        validation = best_of(validate, to_orange_table(samples))
+        print('{:>8} {:>12.3f} {:>12.3f} {:>7.1f}x {:>14.3f}'.format(n, rows, columnar, rows / columnar, validation))
+
+
+if __name__ == '__main__':
+    main([int(n) for n in sys.argv[1:]] or [1000, 10000, 50000])
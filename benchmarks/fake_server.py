@@ -0,0 +1,227 @@
+"""Local stand-in for a Resolwe server serving synthetic `sample-vaccinesurvey` samples
+
+Serves login, `/api/`, `/api/descriptorschema` and `/api/sample` with limit/offset pagination,
+`modified__gte` and `id__in` filtering, `id`/`-modified` ordering, id-only listings,
+ETag revalidation and gzip compression of responses.
+Samples are generated from their ids on request, so memory does not grow
+with the number of samples. Run standalone with
+
+    python -m benchmarks.fake_server --samples 100000 --latency 0.05 --port 8001
+"""
+import argparse
+import datetime
+import gzip
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import urlparse, parse_qs
+
+from .synthetic import make_descriptor
+
+USERNAME = 'admin'
+PASSWORD = 'admin'
+SCHEMA_SLUG = 'sample-vaccinesurvey'
+EPOCH = datetime.datetime(2016, 1, 1)
+
+
+def _fields(type_, *names, **extra):
+    return [dict({'name': name, 'label': name, 'type': type_}, **extra) for name in names]
+
+
+DESCRIPTOR_SCHEMA = {
+    'id': 1,
+    'slug': SCHEMA_SLUG,
+    'version': '1.0.0',
+    'schema': [{'name': 'sample', 'label': 'Sample', 'group': (
+        _fields('basic:string:', 'study_code') +
+        _fields('basic:string:', 'sex', choices=[{'label': value, 'value': value} for value in 'FM']) +
+        _fields('basic:date:', 'entry_date', 'birth_date') +
+        _fields('basic:string:', 'village_code') +
+        [{'name': 'location', 'label': 'Location', 'group': _fields('basic:decimal:', 'latitude', 'longitude')}] +
+        _fields('basic:string:', 'ethnicity', 'fever', 'antimalaria_treatment', 'hospital_visit', 'vomit', 'cough',
+                'diarrhoea', 'bednet') +
+        _fields('basic:decimal:', 'body_temp') +
+        [{'name': 'immunological_data', 'label': 'Immunological data',
+          'group': _fields('basic:decimal:', 'ama1', 'msp1', 'msp2', 'nanp', 'total_ige')}]
+    )}],
+}
+
+
+def make_sample(i):
+    """Return JSON of i-th sample (ids start at 1)."""
+    modified = EPOCH + datetime.timedelta(seconds=i)
+    return {
+        'id': i,
+        'slug': 'sample-{}'.format(i),
+        'name': 'Sample {}'.format(i),
+        'modified': modified.isoformat(),
+        'descriptor_schema': {'slug': SCHEMA_SLUG},
+        'descriptor': {'sample': make_descriptor(i, random.Random(i))},
+    }
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, content, status=200, headers=()):
+        body = json.dumps(content).encode('utf-8')
+        etag = '"{}"'.format(hashlib.sha1(body).hexdigest())
+        if status == 200 and self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(status)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Type', 'application/json')
+        if self.server.config['compress'] and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body, compresslevel=6)
+            self.send_header('Content-Encoding', 'gzip')
+        self.server.sent_bytes += len(body)
+        self.send_header('Content-Length', str(len(body)))
+        for header in headers:
+            self.send_header(*header)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        config = self.server.config
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8')
+        time.sleep(config['latency'])
+        if not urlparse(self.path).path.rstrip('/').endswith('login'):
+            return self._send_json({'detail': 'Not found.'}, 404)
+
+        try:
+            credentials = json.loads(body)
+        except ValueError:
+            credentials = {key: values[0] for key, values in parse_qs(body).items()}
+        username = credentials.get('username', credentials.get('email'))
+        if (username, credentials.get('password')) != (USERNAME, PASSWORD):
+            return self._send_json({'detail': 'Invalid credentials.'}, 400)
+        self._send_json({}, headers=[('Set-Cookie', 'sessionid=fake-session; Path=/'),
+                                     ('Set-Cookie', 'csrftoken=fake-token; Path=/')])
+
+    def do_GET(self):
+        config = self.server.config
+        url = urlparse(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        time.sleep(config['latency'])
+        self.server.requests += 1
+
+        path = url.path.rstrip('/')
+        if path == '/api':
+            return self._send_json({'descriptorschema': '/api/descriptorschema', 'sample': '/api/sample'})
+        if path == '/api/descriptorschema':
+            schemas = [DESCRIPTOR_SCHEMA] if query.get('slug', SCHEMA_SLUG) == SCHEMA_SLUG else []
+            if query.get('fields'):
+                schemas = [{key: schema[key] for key in query['fields'].split(',')} for schema in schemas]
+            return self._send_json(schemas)
+        if path != '/api/sample':
+            return self._send_json({'detail': 'Not found.'}, 404)
+        if 'sessionid=fake-session' not in self.headers.get('Cookie', ''):
+            return self._send_json([])
+
+        ids = range(1, config['samples'] + 1)
+        if query.get('descriptor_schema__slug', SCHEMA_SLUG) != SCHEMA_SLUG:
+            ids = range(0)
+        if query.get('modified__gte'):
+            since = datetime.datetime.strptime(query['modified__gte'][:19], '%Y-%m-%dT%H:%M:%S')
+            ids = range(max(ids.start, int((since - EPOCH).total_seconds())), ids.stop)
+        if query.get('id__in'):
+            ids = sorted(set(ids) & {int(id_) for id_ in query['id__in'].split(',')})
+        if query.get('ordering') == '-modified':
+            ids = ids[::-1]
+
+        id_only = query.get('fields') == 'id'
+        if 'limit' not in query:
+            return self._send_json([{'id': i} if id_only else make_sample(i) for i in ids])
+
+        limit = min(int(query['limit']), config['max_page_size'])
+        offset = int(query.get('offset', 0))
+        page = ids[offset:offset + limit]
+        self._send_json({
+            'count': len(ids),
+            'next': 'http://{}:{}{}'.format(*self.server.server_address, url.path) if offset + limit < len(ids) else None,
+            'previous': None,
+            'results': [{'id': i} if id_only else make_sample(i) for i in page],
+        })
+
+
+class FakeResolweServer(object):
+    """Fake Resolwe server running in a background thread.
+
+    :param samples: number of samples served
+    :param latency: seconds each request is delayed by
+    :param max_page_size: the largest page returned regardless of requested limit
+    :param compress: whether responses are gzipped for clients that accept it
+    """
+
+    def __init__(self, samples=1000, latency=0.0, max_page_size=1000, host='127.0.0.1', port=0, compress=True):
+        self._server = _ThreadingHTTPServer((host, port), _Handler)
+        self._server.config = {'samples': samples, 'latency': latency, 'max_page_size': max_page_size,
+                               'compress': compress}
+        self._server.requests = 0
+        self._server.sent_bytes = 0
+        self._thread = None
+
+    @property
+    def url(self):
+        return 'http://{}:{}'.format(*self._server.server_address)
+
+    @property
+    def requests(self):
+        return self._server.requests
+
+    @property
+    def sent_bytes(self):
+        """Bytes of response bodies sent, as transferred (compressed)."""
+        return self._server.sent_bytes
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--samples', type=int, default=1000)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds per request')
+    parser.add_argument('--max-page-size', type=int, default=1000)
+    parser.add_argument('--no-compress', action='store_true', help='do not gzip responses')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    args = parser.parse_args()
+    server = FakeResolweServer(args.samples, args.latency, args.max_page_size, args.host, args.port,
+                               not args.no_compress)
+    print(server.url, flush=True)
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
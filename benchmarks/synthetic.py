@@ -0,0 +1,49 @@
+"""Synthetic `sample-vaccinesurvey` samples for benchmarks"""
+import datetime
+import random
+
+VILLAGES = ['V{:02d}'.format(i) for i in range(40)]
+ETHNICITIES = ['A', 'B', 'C', 'D', 'E']
+YES_NO = ['yes', 'no']
+
+
+def make_descriptor(i, rng=random):
+    """Return a random sample descriptor (the `sample` descriptor group)."""
+    birth = datetime.date(1990, 1, 1) + datetime.timedelta(days=rng.randrange(8000))
+    entry = datetime.date(2014, 1, 1) + datetime.timedelta(days=rng.randrange(900))
+    descriptor = {
+        'study_code': 'S{:07d}'.format(i),
+        'sex': rng.choice(['M', 'F']),
+        'entry_date': entry.isoformat(),
+        'birth_date': birth.isoformat(),
+        'village_code': rng.choice(VILLAGES),
+        'location': {'latitude': rng.uniform(-5, 5), 'longitude': rng.uniform(30, 40)},
+        'ethnicity': rng.choice(ETHNICITIES),
+        'fever': rng.choice(YES_NO),
+        'antimalaria_treatment': rng.choice(YES_NO),
+        'hospital_visit': rng.choice(YES_NO),
+        'vomit': rng.choice(YES_NO),
+        'cough': rng.choice(YES_NO),
+        'diarrhoea': rng.choice(YES_NO),
+        'bednet': rng.choice(YES_NO),
+        'body_temp': round(rng.gauss(37, 0.8), 1),
+    }
+    if rng.random() < 0.8:
+        descriptor['immunological_data'] = {
+            antigen: round(rng.lognormvariate(0, 1), 3)
+            for antigen in ('ama1', 'msp1', 'msp2', 'nanp', 'total_ige')
+        }
+    return descriptor
+
+
+class Sample(object):
+    """Minimal stand-in for resdk Sample."""
+
+    def __init__(self, id, descriptor):
+        self.id = id
+        self.descriptor = {'sample': descriptor}
+
+
+def make_samples(n, seed=0):
+    rng = random.Random(seed)
+    return [Sample(i, make_descriptor(i, rng)) for i in range(n)]
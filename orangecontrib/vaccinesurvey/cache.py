@@ -0,0 +1,128 @@
+"""On-disk cache of converted Orange tables"""
+import hashlib
+import os
+import pickle
+import shutil
+import tempfile
+
+import numpy as np
+from Orange.data import Table
+
+from .instrumentation import stats
+
+
+def _hash(*parts):
+    return hashlib.sha1('\n'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+def data_version(samples, previous=None):
+    """Return version of downloaded samples (resdk Samples or their JSON): their count and last modification.
+
+    Pass version of previously downloaded samples as `previous` to account for
+    samples that arrive in several batches.
+    """
+    count, last = (0, '') if previous is None else previous.split(':', 1)
+    count = int(count)
+    for sample in samples:
+        modified = sample.get('modified') if isinstance(sample, dict) else sample.modified
+        if hasattr(modified, 'isoformat'):
+            modified = modified.isoformat()
+        if modified and modified > last:
+            last = modified
+        count += 1
+    return '{}:{}'.format(count, last)
+
+
+def content_hash(table):
+    """Return hash of table's domain and values."""
+    h = hashlib.sha1()
+    h.update(repr([(type(var).__name__, var.name, getattr(var, 'values', None))
+                   for var in table.domain.variables + table.domain.metas]).encode('utf-8'))
+    h.update(np.ascontiguousarray(table.X, dtype=float).tobytes())
+    # repr tells apart codes of discrete metas from strings with the same text
+    h.update('\x00'.join(map(repr, np.ravel(table.metas))).encode('utf-8'))
+    return h.hexdigest()
+
+
+class TableCache(object):
+    """Store converted tables as memory-mappable NumPy arrays and a pickled Domain.
+
+    Tables are keyed by server url, schema slug and data version; the version
+    stored last for a server and schema can be loaded without knowing it, so a
+    previous dataset can be shown before the data is revalidated.
+    """
+
+    def __init__(self, path, keep=2):
+        self.path = path
+        self.keep = keep
+
+    def _prefix(self, url, schema):
+        return os.path.join(self.path, _hash(url, schema))
+
+    def save(self, url, schema, version, table):
+        prefix = self._prefix(url, schema)
+        os.makedirs(prefix, exist_ok=True)
+        name = _hash(version)
+        target = os.path.join(prefix, name)
+
+        tmp_dir = tempfile.mkdtemp(dir=prefix)
+        np.save(os.path.join(tmp_dir, 'X.npy'), np.asarray(table.X, dtype=float))
+        # Meta columns are stored by type: strings of string variables, floats (codes) of the others
+        for i, var in enumerate(table.domain.metas):
+            column = table.metas[:, i]
+            if var.is_string:
+                column = np.array(['' if value is None else str(value) for value in column], dtype=str)
+            else:
+                column = column.astype(float)
+            np.save(os.path.join(tmp_dir, 'metas_{}.npy'.format(i)), column)
+        with open(os.path.join(tmp_dir, 'domain.pkl'), 'wb') as f:
+            pickle.dump(table.domain, f, protocol=pickle.HIGHEST_PROTOCOL)
+        with open(os.path.join(tmp_dir, 'version'), 'w') as f:
+            f.write(version)
+
+        shutil.rmtree(target, ignore_errors=True)
+        os.rename(tmp_dir, target)
+        with open(os.path.join(prefix, 'latest'), 'w') as f:
+            f.write(name)
+        self._evict(prefix)
+
+    def _evict(self, prefix):
+        entries = sorted((os.path.join(prefix, name) for name in os.listdir(prefix)
+                          if os.path.isdir(os.path.join(prefix, name))), key=os.path.getmtime, reverse=True)
+        for entry in entries[self.keep:]:
+            shutil.rmtree(entry, ignore_errors=True)
+
+    def _load(self, entry, mmap):
+        entry = self._read(entry, mmap)
+        stats.count('table_cache.miss' if entry is None else 'table_cache.hit')
+        return entry
+
+    def _read(self, entry, mmap):
+        try:
+            with open(os.path.join(entry, 'version')) as f:
+                version = f.read()
+            with open(os.path.join(entry, 'domain.pkl'), 'rb') as f:
+                domain = pickle.load(f)
+            X = np.load(os.path.join(entry, 'X.npy'), mmap_mode='c' if mmap else None)
+            metas = np.empty((len(X), len(domain.metas)), dtype=object)
+            for i in range(len(domain.metas)):
+                metas[:, i] = np.load(os.path.join(entry, 'metas_{}.npy'.format(i))).astype(object)
+        except (OSError, ValueError, EOFError, pickle.UnpicklingError):
+            return None
+        return version, Table.from_numpy(domain, X, metas=metas)
+
+    def load(self, url, schema, version, mmap=True):
+        """Return table of given data version or None."""
+        entry = self._load(os.path.join(self._prefix(url, schema), _hash(version)), mmap)
+        return entry[1] if entry else None
+
+    def load_latest(self, url, schema, mmap=True):
+        """Return (version, table) of the table stored last or None."""
+        prefix = self._prefix(url, schema)
+        try:
+            with open(os.path.join(prefix, 'latest')) as f:
+                name = f.read().strip()
+        except OSError:
+            stats.count('table_cache.miss')
+            return None
+        return self._load(os.path.join(prefix, name), mmap)
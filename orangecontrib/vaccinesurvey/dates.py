@@ -0,0 +1,68 @@
+"""Bulk conversion of date columns"""
+import warnings
+
+import numpy as np
+
+SECONDS_PER_YEAR = 365.25 * 24 * 3600
+
+
+def _to_seconds(dates):
+    """Return epoch seconds of datetime64 values, with NaN for NaT."""
+    dates = np.asarray(dates, dtype='datetime64[s]')
+    return np.where(np.isnat(dates), np.nan, dates.astype(np.int64).astype(float))
+
+
+def _parse_one(value, var=None):
+    """Return epoch seconds of a single date string or NaN if it is malformed."""
+    if '-' in value:
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                seconds = _to_seconds(np.datetime64(value, 's'))
+            if not np.isnan(seconds):
+                return float(seconds)
+        except ValueError:
+            pass
+    if var is not None:
+        try:
+            return var.parse(value)
+        except ValueError:
+            pass
+    return np.nan
+
+
+def parse_dates(values, var=None):
+    """Convert a column of date strings (None or empty for missing) to epoch seconds.
+
+    Each distinct string is parsed once: all of them at once as ISO 8601
+    with NumPy, and only if that fails one by one, falling back to Orange's
+    TimeVariable `var`. NumPy reads a string of digits as a year, so dates
+    without a '-' (such as compact '20160101') are left to `var`. Return the converted column, the number of malformed
+    dates (including 'NaT') and whether any date also has a time of day.
+    """
+    values = np.asarray(values, dtype=object)
+    result = np.full(len(values), np.nan)
+    present = np.not_equal(values, None) & np.not_equal(values, '')
+    if not present.any():
+        return result, 0, False
+
+    unique, inverse = np.unique(values[present].astype(str), return_inverse=True)
+    extended = np.char.find(unique, '-') >= 0
+    parsed = np.full(len(unique), np.nan)
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            parsed[extended] = _to_seconds(unique[extended].astype('datetime64[s]'))
+    except ValueError:
+        parsed[extended] = [_parse_one(value, var) for value in unique[extended]]
+    parsed[~extended] = [_parse_one(value, var) for value in unique[~extended]]
+
+    malformed = np.isnan(parsed)
+    result[present] = parsed[inverse]
+    has_time = bool(np.any(parsed[~malformed] % 86400))
+    return result, int(np.sum(malformed[inverse])), has_time
+
+
+def age_in_years(date, birth_date):
+    """Return age (years) at `date` from epoch seconds columns."""
+    return (np.asarray(date) - np.asarray(birth_date)) / SECONDS_PER_YEAR
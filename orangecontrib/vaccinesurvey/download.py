@@ -0,0 +1,175 @@
+"""Download of samples into tables, shared by the widget and the command line"""
+import hashlib
+import os
+
+from Orange.misc import environ
+
+from . import parallel
+from .cache import TableCache
+from .records import SampleRecord
+from .resolwe import TableBuilder, match_filters, PAGE_SIZE, SCHEMA_SLUG
+from .schema import SchemaRegistry, get_schema
+from .sync import SampleSnapshot
+from .validation import validate
+
+cache_path = os.path.join(environ.cache_dir(), "resolwe")
+#  converted tables, shown while the data is revalidated
+table_cache = TableCache(os.path.join(cache_path, 'tables'))
+#  responses of this add-on's requests, revalidated with the server; see get_http_cache
+http_cache = None
+#  definitions of descriptor schemas on servers
+schema_registry = SchemaRegistry(os.path.join(cache_path, 'schemas.json'))
+
+
+def get_http_cache(create=True):
+    """Return the shared HTTP cache, opening it (and importing requests) on first use.
+
+    If `create` is not set, return None if the cache is not open yet.
+    """
+    global http_cache
+    if http_cache is None and create:
+        from .httpcache import HTTPCache
+        os.makedirs(cache_path, exist_ok=True)
+        http_cache = HTTPCache(os.path.join(cache_path, 'vaccinesurvey_http.sqlite'))
+    return http_cache
+
+
+def session_schema(res):
+    """Return key of the schema of samples on the server of `res` (ResolweAPI), as registered by schema_registry.
+
+    The schema is retrieved once per session. If the server does not list
+    descriptor schemas, the built-in schema (resolwe.DATA and METAS) is used.
+    """
+    # Until set for the session, ResolweAPI.schema is the built-in schema of the class
+    if 'schema' not in vars(res):
+        try:
+            schema = schema_registry.get(res, SCHEMA_SLUG, get_schema(SCHEMA_SLUG))
+        except Exception:  # servers without (access to) descriptor schemas, connection problems
+            schema = get_schema(SCHEMA_SLUG)
+        res.schema = schema.key
+    return res.schema
+
+
+def latest_schema(url):
+    """Return key of the schema of samples on server at `url` as retrieved last (see session_schema)."""
+    return schema_registry.latest(url, SCHEMA_SLUG, get_schema(SCHEMA_SLUG)).key
+
+
+def snapshot_file(url, user):
+    """Return path of the local sample snapshot for given server and user."""
+    os.makedirs(cache_path, exist_ok=True)
+    key = hashlib.sha1('{}\n{}'.format(url, user).encode('utf-8')).hexdigest()
+    return os.path.join(cache_path, 'snapshot_{}.json'.format(key))
+
+
+def sync_snapshot(res, snapshot_file, page_size=PAGE_SIZE, workers=1, cancelled=None, on_page=None):
+    """Synchronize the snapshot at `snapshot_file` with the server and return records of all its samples.
+
+    If the snapshot is empty, all samples are retrieved, and `on_page` is
+    called with the number of samples on the server and records of each page
+    (see SampleSnapshot.sync). Return None if cancelled; the snapshot is then
+    not saved.
+    """
+    snapshot = SampleSnapshot.load(snapshot_file, session_schema(res))
+    snapshot.sync(res, page_size, workers, cancelled, on_page if not len(snapshot) else None)
+    if cancelled is not None and cancelled.is_set():
+        return None
+    snapshot.save(snapshot_file)
+    return snapshot.records()
+
+
+def sample_pages(res, snapshot_file=None, page_size=PAGE_SIZE, workers=1, filters=None, cancelled=None):
+    """Yield numbers of processed and of all samples, and records (records.SampleRecord) of a page of samples.
+
+    If `snapshot_file` is given, the snapshot there is synchronized with the
+    server and all samples are taken from it; otherwise they are downloaded,
+    with filters applied on the server. Records are filtered locally as well,
+    in case the server does not support some of the filters. Samples are
+    parsed with the schema of the server (see session_schema).
+    """
+    filters = filters or {}
+    schema = session_schema(res)
+    if snapshot_file:
+        samples = sync_snapshot(res, snapshot_file, page_size, workers, cancelled)
+        if samples is None:
+            return
+        pages = ((len(samples), samples[i:i + page_size]) for i in range(0, len(samples), page_size))
+    else:
+        pages = ((page['count'], [SampleRecord.from_sample(sample, schema) for sample in page['results']])
+                 for page in res.get_sample_pages(page_size, workers=workers, cancelled=cancelled, filters=filters))
+
+    done = 0
+    for count, records in pages:
+        if cancelled is not None and cancelled.is_set():
+            return
+        done += len(records)
+        yield done, count, [record for record in records if match_filters(record, filters)]
+
+
+def download(res, snapshot_file=None, page_size=PAGE_SIZE, workers=1, filters=None, values=None, cancelled=None,
+             on_page=None):
+    """Download samples page by page and convert them to a table as they arrive.
+
+    `values` are values of discrete variables from previous loads (see
+    TableBuilder). After each page, `on_page` is called with numbers of
+    processed and of all samples and the TableBuilder.
+
+    With `snapshot_file`, samples are taken from the synchronized snapshot. On
+    the first synchronization, when all samples are retrieved, they are
+    converted as pages arrive. Otherwise, all samples are known once the
+    snapshot is synchronized; if enabled (see parallel.PARALLEL_THRESHOLD),
+    many of them are converted at once in several processes (see
+    parallel.records_to_table_parallel), without calls of `on_page`.
+
+    The table is validated (see validation.validate). Return data version,
+    the table and numbers of malformed dates per column, or None if cancelled.
+    The version is the one reported by the server (see
+    ResolweAPI.get_data_version) before the download, so it can be compared
+    with later checks even if the server ignores some of the filters, which
+    are then applied locally.
+    """
+    filters = filters or {}
+    schema = session_schema(res)
+    version = res.get_data_version(filters)
+    builder, ids = None, []
+
+    def add_page(done, count, records):
+        nonlocal builder
+        if builder is None:
+            builder = TableBuilder(count, schema, values)
+        builder.extend_records(records)
+        ids.extend(record.id for record in records)
+        if on_page is not None:
+            on_page(done, count, builder)
+
+    if snapshot_file:
+        retrieved = 0
+
+        def on_sync_page(count, records):
+            nonlocal retrieved
+            retrieved += len(records)
+            add_page(retrieved, count, [record for record in records if match_filters(record, filters)])
+
+        samples = sync_snapshot(res, snapshot_file, page_size, workers, cancelled, on_sync_page)
+        if samples is None:
+            return None
+        samples = [record for record in samples if match_filters(record, filters)]
+        # Rows converted while synchronizing are used unless samples were removed or added afterwards
+        if builder is None or ids != [record.id for record in samples]:
+            if parallel.use_parallel(len(samples)):
+                table, malformed_dates = parallel.records_to_table_parallel(samples, schema=schema, values=values)
+                table, _ = validate(table)
+                return version, table, malformed_dates
+            builder, ids = None, []
+            for i in range(0, len(samples), page_size):
+                if cancelled is not None and cancelled.is_set():
+                    break
+                add_page(min(i + page_size, len(samples)), len(samples), samples[i:i + page_size])
+    else:
+        for done, count, records in sample_pages(res, None, page_size, workers, filters, cancelled):
+            add_page(done, count, records)
+    if cancelled is not None and cancelled.is_set():
+        return None
+    builder = builder or TableBuilder(0, schema, values)
+    table, _ = validate(builder.table())
+    return version, table, builder.malformed_dates
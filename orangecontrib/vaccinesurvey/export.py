@@ -0,0 +1,144 @@
+"""Export of samples without GUI
+
+Samples are downloaded and converted as in the Import Samples widget, with
+the same caches, e.g.
+
+    orange-vaccinesurvey-export --url https://server --user analyst --output cohort.vss
+
+CSV output is written page by page as samples arrive, with raw values of
+descriptor fields; other formats are written from the converted table.
+"""
+import argparse
+import csv
+import getpass
+import os
+import sys
+
+from .download import download, sample_pages, session_schema, snapshot_file, table_cache, get_http_cache
+from .instrumentation import stats, format_summary
+from .resolwe import FILTERS, PAGE_SIZE, MAX_WORKERS, discrete_values
+from .schema import get_schema
+from .session import sessions
+from .snapshot import save_snapshot, EXTENSION
+
+#  environment variable with password, used if it is not given otherwise
+PASSWORD_VARIABLE = 'RESOLWE_PASSWORD'
+
+
+def _filters(filters):
+    """Return filters with all names from FILTERS (as used by the widget)."""
+    filters = filters or {}
+    return {name: (filters.get(name) or '').strip() for name in FILTERS}
+
+
+def load_samples(url, username, password, page_size=PAGE_SIZE, workers=MAX_WORKERS, incremental=True,
+                 filters=None, use_cache=True):
+    """Return data version and table of samples from the server.
+
+    If the data on the server has not changed since the table was stored in
+    the table cache (by this function or by the widget), the stored table is
+    returned. With `incremental` set, only samples changed since the last
+    download are retrieved and the others are taken from the local snapshot.
+    """
+    filters = _filters(filters)
+    res = sessions.get(username, password, url, get_http_cache())
+    schema = session_schema(res)
+    key = ' {}'.format(sorted(filters.items()))
+    if use_cache:
+        version = res.get_data_version(filters)
+        table = table_cache.load(url, schema, version + key)
+        if table is not None:
+            return version, table
+
+    # Discrete values keep the codes of the table stored last, which the widget shows and extends (see TableBuilder)
+    latest = table_cache.load_latest(url, schema)
+    version, table, _ = download(res, snapshot_file(url, username) if incremental else None, page_size, workers,
+                                 filters, discrete_values(latest[1].domain) if latest else None)
+    table_cache.save(url, schema, version + key, table)
+    return version, table
+
+
+def _write_csv(path, pages, schema):
+    """Write records from pages (see download.sample_pages) to CSV; return the number of rows."""
+    schema = get_schema(schema)
+    n_rows = 0
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['id'] + [var[0] for var in list(schema.data) + list(schema.metas)])
+        for _, _, records in pages:
+            writer.writerows([record.id] + ['' if value is None else value for value in record.values]
+                             for record in records)
+            n_rows += len(records)
+    return n_rows
+
+
+def export_samples(output, url, username, password, page_size=PAGE_SIZE, workers=MAX_WORKERS, incremental=True,
+                   filters=None, compress=False):
+    """Download samples and write them to `output`; return the number of written samples.
+
+    The format is chosen by extension: `.csv` is streamed, `.vss` is a snapshot
+    (see snapshot.save_snapshot) and other formats are written by Orange.
+    """
+    # Output is written to a temporary file in the same directory with the same
+    # extension (Orange chooses the writer by it) and replaces the old one when complete
+    root, extension = os.path.splitext(output)
+    tmp_path = root + '.tmp' + extension
+    try:
+        n_rows = _export(output, tmp_path, url, username, password, page_size, workers, incremental, filters,
+                         compress)
+        os.replace(tmp_path, output)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return n_rows
+
+
+def _export(output, tmp_path, url, username, password, page_size, workers, incremental, filters, compress):
+    if output.endswith('.csv'):
+        filters = _filters(filters)
+        res = sessions.get(username, password, url, get_http_cache())
+        pages = sample_pages(res, snapshot_file(url, username) if incremental else None, page_size, workers, filters)
+        n_rows = _write_csv(tmp_path, pages, session_schema(res))
+    else:
+        version, table = load_samples(url, username, password, page_size, workers, incremental, filters)
+        if output.endswith(EXTENSION):
+            save_snapshot(tmp_path, table, compress, url=url, version=version, filters=_filters(filters))
+        else:
+            table.save(tmp_path)
+        n_rows = len(table)
+    return n_rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export vaccine survey samples from a Resolwe server.')
+    parser.add_argument('--url', required=True, help='server url')
+    parser.add_argument('--user', required=True, help='username')
+    parser.add_argument('--password', help='password (default: ${} or prompt)'.format(PASSWORD_VARIABLE))
+    parser.add_argument('--output', required=True,
+                        help='output file; format by extension: {}, .csv (streamed), .tab, .pkl, ...'.format(EXTENSION))
+    parser.add_argument('--page-size', type=int, default=PAGE_SIZE, help='samples per request')
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS, help='parallel requests')
+    parser.add_argument('--full', action='store_true', help='download all samples instead of only the changed ones')
+    parser.add_argument('--compress', action='store_true', help='compress snapshot (it is then not memory-mapped)')
+    parser.add_argument('--stats', action='store_true', help='print timings of download and conversion')
+    for name in FILTERS:
+        parser.add_argument('--' + name.replace('_', '-'), default='', help='filter samples by ' + name)
+    args = parser.parse_args(argv)
+
+    password = args.password or os.environ.get(PASSWORD_VARIABLE) or getpass.getpass()
+    filters = {name: getattr(args, name) for name in FILTERS}
+    mark = stats.mark()
+    try:
+        n_rows = export_samples(args.output, args.url, args.user, password, args.page_size, args.workers,
+                                not args.full, filters, args.compress)
+    except Exception as e:  # errors of login, connection or output are reported without traceback
+        print('Export failed: {}'.format(e), file=sys.stderr)
+        return 1
+    print('Exported {} samples to {}.'.format(n_rows, args.output))
+    if args.stats:
+        print(format_summary(stats.summary(mark)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,24 @@
+"""Decoding of JSON with orjson, if it is installed, or with the standard json module"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def loads(data):
+    """Return object decoded from JSON `data` (bytes in UTF-8 or str)."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def accept_encoding():
+    """Return value of Accept-Encoding header with all content encodings that responses can be decoded from.
+
+    gzip and deflate are always supported, brotli and zstd if their decoders
+    (brotli or brotlicffi, zstandard) are installed.
+    """
+    from urllib3.util.request import ACCEPT_ENCODING
+    return ACCEPT_ENCODING
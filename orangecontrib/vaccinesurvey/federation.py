@@ -0,0 +1,90 @@
+"""Merging of samples loaded from several servers"""
+from collections import OrderedDict
+
+import numpy as np
+from Orange.data import DiscreteVariable, StringVariable, TimeVariable, Domain, Table
+
+from .instrumentation import stats
+
+# Meta column with the server each sample was loaded from
+SOURCE = 'server'
+# Samples are the same if they have the same value of this column
+KEY = 'study_code'
+
+
+def _unified_variables(variables):
+    """Return variables (one per name) that can hold values of all given variables.
+
+    Values of a discrete variable are those of its first occurrence followed by
+    the new values from the other occurrences, sorted.
+    """
+    by_name = OrderedDict()
+    for var in variables:
+        by_name.setdefault(var.name, []).append(var)
+    unified = []
+    for name, same in by_name.items():
+        first = same[0]
+        if first.is_discrete:
+            values = list(first.values)
+            values += sorted({value for var in same[1:] for value in var.values} - set(values))
+            unified.append(DiscreteVariable(name, values=values))
+        elif first.is_time:
+            unified.append(TimeVariable(name, have_date=any(var.have_date for var in same),
+                                        have_time=any(var.have_time for var in same)))
+        else:
+            unified.append(type(first)(name))
+    return unified
+
+
+def _column(table, var, target):
+    """Return column of `table` for variable `target` (with the same name as `var`), recoding discrete values."""
+    if var is None:
+        if target.is_string:
+            return np.full(len(table), StringVariable.Unknown, dtype=object)
+        return np.full(len(table), np.nan)
+    column = table.get_column(var)
+    if target.is_discrete:
+        codes = np.array([target.values.index(value) for value in var.values] or [0], dtype=float)
+        column = column.astype(float)
+        defined = ~np.isnan(column)
+        column[defined] = codes[column[defined].astype(int)]
+    return column
+
+
+def merge_tables(tables, key=KEY):
+    """Merge tables of samples from several servers into one table.
+
+    `tables` is a list of pairs (server, Table). Columns are matched by name and
+    values of discrete variables are unified (see `_unified_variables`). A meta
+    column `server` tells where each sample comes from. Samples with a value of
+    `key` that already appears in an earlier table (or earlier in the same one)
+    are dropped, so servers listed first take precedence.
+    """
+    with stats.span('merge') as span:
+        domains = [table.domain for _, table in tables]
+        attributes = _unified_variables(var for domain in domains for var in domain.attributes)
+        metas = _unified_variables(var for domain in domains for var in domain.metas if var.name != SOURCE)
+        source = DiscreteVariable(SOURCE, values=list(OrderedDict.fromkeys(server for server, _ in tables)))
+        domain = Domain(attributes, metas=metas + [source])
+
+        X, M = [], []
+        for server, table in tables:
+            names = {var.name: var for var in table.domain.variables + table.domain.metas}
+            X.append(np.column_stack([_column(table, names.get(var.name), var) for var in attributes]
+                                     or [np.empty((len(table), 0))]).astype(float))
+            columns = [_column(table, names.get(var.name), var) for var in metas]
+            columns.append(np.full(len(table), float(source.values.index(server))))
+            M.append(np.column_stack(columns).astype(object))
+        X = np.vstack(X) if X else np.empty((0, len(attributes)))
+        M = np.vstack(M) if M else np.empty((0, len(metas) + 1), dtype=object)
+
+        if key in [var.name for var in metas]:
+            keys = M[:, [var.name for var in metas].index(key)]
+            missing = np.array([value is None or value == '' or value != value for value in keys], dtype=bool)
+            keys = np.where(missing, '', keys).astype(str)
+            _, first = np.unique(keys, return_index=True)
+            keep = missing.copy()
+            keep[first] = True
+            X, M = X[keep], M[keep]
+        span.rows = len(X)
+        return Table.from_numpy(domain, X, metas=M)
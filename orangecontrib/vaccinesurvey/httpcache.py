@@ -0,0 +1,136 @@
+"""Size-bounded cache of HTTP responses revalidated with ETag/Last-Modified"""
+import json
+import sqlite3
+import threading
+import time
+
+from requests.adapters import HTTPAdapter
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from .instrumentation import stats
+
+# Headers that do not apply to the decoded body kept in cache
+_DROPPED_HEADERS = ('content-encoding', 'content-length', 'transfer-encoding', 'set-cookie')
+
+
+class HTTPCache(object):
+    """Responses to GET requests stored in sqlite, evicting least recently used ones above `max_size` bytes.
+
+    Only responses with an ETag or Last-Modified header are stored and they
+    are always revalidated with the server; a cached response is used when
+    the server answers with 304 Not Modified.
+    """
+
+    def __init__(self, path, max_size=200 * 2 ** 20):
+        self.path = path
+        self.max_size = max_size
+        self.hits = self.misses = self.evictions = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute('CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, etag TEXT, '
+                             'last_modified TEXT, headers TEXT, body BLOB, size INTEGER, accessed REAL)')
+
+    def get(self, key):
+        """Return (etag, last_modified, headers, body) of cached response or None."""
+        with self._lock:
+            row = self._db.execute('SELECT etag, last_modified, headers, body FROM responses WHERE key = ?',
+                                   (key,)).fetchone()
+        if row is None:
+            return None
+        return row[0], row[1], json.loads(row[2]), row[3]
+
+    def touch(self, key):
+        with self._lock, self._db:
+            self._db.execute('UPDATE responses SET accessed = ? WHERE key = ?', (time.time(), key))
+
+    def set(self, key, etag, last_modified, headers, body):
+        with self._lock, self._db:
+            self._db.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)',
+                             (key, etag, last_modified, json.dumps(headers), body, len(body), time.time()))
+            self._evict()
+
+    def _evict(self):
+        size = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if size <= self.max_size:
+            return
+        evicted = []
+        for key, entry_size in self._db.execute('SELECT key, size FROM responses ORDER BY accessed'):
+            if size <= self.max_size:
+                break
+            evicted.append((key,))
+            size -= entry_size
+        self._db.executemany('DELETE FROM responses WHERE key = ?', evicted)
+        self.evictions += len(evicted)
+        stats.count('http_cache.evicted', len(evicted))
+
+    def clear(self):
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM responses')
+
+    def info(self):
+        """Return numbers of hits, misses, evictions, stored responses and their size in bytes."""
+        with self._lock:
+            entries, size = self._db.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses').fetchone()
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'entries': entries, 'size': size, 'max_size': self.max_size}
+
+
+class CachingAdapter(HTTPAdapter):
+    """Transport adapter that revalidates GET requests against HTTPCache.
+
+    Responses are stored under `namespace` (e.g. server url and user), so
+    users sharing the cache file never get each other's responses. Returned
+    responses have `from_cache` set.
+    """
+
+    def __init__(self, cache, namespace='', **kwargs):
+        super().__init__(**kwargs)
+        self.cache = cache
+        self.namespace = namespace
+
+    def send(self, request, **kwargs):
+        if request.method != 'GET':
+            return super().send(request, **kwargs)
+
+        key = '{} {}'.format(self.namespace, request.url)
+        cached = self.cache.get(key)
+        if cached is not None:
+            etag, last_modified = cached[:2]
+            if etag:
+                request.headers['If-None-Match'] = etag
+            if last_modified:
+                request.headers['If-Modified-Since'] = last_modified
+
+        response = super().send(request, **kwargs)
+        if cached is not None and response.status_code == 304:
+            response.content  # read the empty body to release the connection
+            self.cache.touch(key)
+            self.cache.hits += 1
+            return self._cached_response(request, response, *cached[2:])
+
+        self.cache.misses += 1
+        etag, last_modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+        if response.status_code == 200 and (etag or last_modified) and not kwargs.get('stream'):
+            headers = {name: value for name, value in response.headers.items()
+                       if name.lower() not in _DROPPED_HEADERS}
+            self.cache.set(key, etag, last_modified, headers, response.content)
+        response.from_cache = False
+        return response
+
+    @staticmethod
+    def _cached_response(request, not_modified, headers, body):
+        response = Response()
+        response.status_code = 200
+        response.reason = 'OK'
+        response.url = request.url
+        response.request = request
+        response.headers = CaseInsensitiveDict(headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.cookies = not_modified.cookies
+        response.elapsed = not_modified.elapsed
+        response._content = body
+        response.from_cache = True
+        return response
@@ -0,0 +1,68 @@
+"""Immunological data in wide (a column per antigen) and long (a row per measurement) form"""
+import numpy as np
+from Orange.data import ContinuousVariable, DiscreteVariable, Domain, Table
+
+from .instrumentation import stats
+from .resolwe import DATA
+
+# Descriptor group with measurements and the antigens measured
+GROUP = 'immunological_data'
+ANTIGENS = [var[0] for var in DATA if var[1].get('group') == GROUP]
+# Columns of the long form
+ANTIGEN = 'antigen'
+VALUE = 'value'
+# Meta column of the long form with the row of the sample in the wide table
+SAMPLE = 'sample'
+
+
+def to_long(table, antigens=ANTIGENS):
+    """Return measurements from columns `antigens` of `table` as a table with a row per defined value.
+
+    Rows have the antigen, the value, metas (such as study code) of the
+    sample and the sample's row in `table` (meta SAMPLE); they are ordered by
+    samples and then by antigens. Missing values are left out.
+    """
+    with stats.span('to_long') as span:
+        names = {var.name for var in table.domain.attributes}
+        antigens = [name for name in antigens if name in names]
+        columns = [table.domain.index(name) for name in antigens]
+        values = table.X[:, columns]
+        rows, antigen = np.nonzero(~np.isnan(values))
+        domain = Domain([DiscreteVariable(ANTIGEN, values=antigens), ContinuousVariable(VALUE)],
+                        metas=table.domain.metas + (ContinuousVariable(SAMPLE, number_of_decimals=0),))
+        X = np.column_stack([antigen.astype(float), values[rows, antigen]])
+        metas = np.empty((len(rows), len(domain.metas)), dtype=object)
+        metas[:, :-1] = table.metas[rows]
+        metas[:, -1] = rows.astype(float)
+        span.rows = len(rows)
+        return Table.from_numpy(domain, X, metas=metas)
+
+
+def to_wide(table):
+    """Return table with a row per sample and a column per antigen from a table in long form (see `to_long`).
+
+    Samples are told apart by the SAMPLE column and are ordered by their first
+    measurement. Rows with unknown antigen are ignored.
+    """
+    with stats.span('to_wide') as span:
+        antigen = table.get_column(ANTIGEN).astype(float)
+        defined = ~np.isnan(antigen)
+        antigen = antigen[defined].astype(int)
+        values = table.get_column(VALUE).astype(float)[defined]
+        keys = table.get_column(SAMPLE).astype(float)[defined]
+        sample = table.domain.metas.index(table.domain[SAMPLE])
+        other = [j for j in range(len(table.domain.metas)) if j != sample]
+        metas = table.metas[defined][:, other]
+
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        order = np.argsort(first)
+        rank = np.empty(len(order), dtype=int)
+        rank[order] = np.arange(len(order))
+
+        antigens = table.domain[ANTIGEN].values
+        X = np.full((len(first), len(antigens)), np.nan)
+        X[rank[inverse.ravel()], antigen] = values
+        domain = Domain([ContinuousVariable(name) for name in antigens],
+                        metas=[table.domain.metas[j] for j in other])
+        span.rows = len(X)
+        return Table.from_numpy(domain, X, metas=metas[first[order]])
@@ -0,0 +1,130 @@
+"""Timings and counters of the import pipeline"""
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+log = logging.getLogger(__name__)
+
+
+class Span(object):
+    """Timed step of the pipeline with the number of rows and bytes it processed."""
+    __slots__ = ('seq', 'name', 'start', 'seconds', 'rows', 'bytes')
+
+    def __init__(self, name):
+        self.seq = None
+        self.name = name
+        self.start = time.time()
+        self.seconds = None
+        self.rows = 0
+        self.bytes = 0
+
+    def to_dict(self):
+        return OrderedDict((key, getattr(self, key)) for key in self.__slots__)
+
+
+class Stats(object):
+    """Collect spans and counters and pass finished spans to sinks.
+
+    Only the last `maxlen` spans are kept; use `mark` and `summary(since=...)`
+    to get the breakdown of a single load.
+    """
+
+    def __init__(self, maxlen=10000):
+        self.spans = deque(maxlen=maxlen)
+        self.counters = OrderedDict()
+        self.sinks = []
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name):
+        """Time the enclosed block; set `rows` and `bytes` of the yielded span."""
+        span = Span(name)
+        start = time.perf_counter()
+        try:
+            yield span
+        finally:
+            span.seconds = time.perf_counter() - start
+            self.add(span)
+
+    def add(self, span):
+        with self._lock:
+            self._seq += 1
+            span.seq = self._seq
+            self.spans.append(span)
+        for sink in self.sinks:
+            sink(span)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def mark(self):
+        """Return a mark for `summary` of spans and counters recorded from now on."""
+        with self._lock:
+            return self._seq, dict(self.counters)
+
+    def summary(self, since=None):
+        """Return calls, total seconds, rows and bytes per span name, and counters."""
+        seq, counters = since or (0, {})
+        spans = OrderedDict()
+        with self._lock:
+            for span in self.spans:
+                if span.seq <= seq:
+                    continue
+                total = spans.setdefault(span.name, OrderedDict(calls=0, seconds=0.0, rows=0, bytes=0))
+                total['calls'] += 1
+                total['seconds'] += span.seconds
+                total['rows'] += span.rows
+                total['bytes'] += span.bytes
+            counters = OrderedDict((name, n - counters.get(name, 0)) for name, n in self.counters.items()
+                                   if n != counters.get(name, 0))
+        return {'spans': spans, 'counters': counters}
+
+    def to_json(self, since=None):
+        return json.dumps(self.summary(since))
+
+    def reset(self):
+        with self._lock:
+            self.spans.clear()
+            self.counters.clear()
+
+
+def logging_sink(logger=log, level=logging.DEBUG):
+    """Return sink that logs finished spans."""
+    def sink(span):
+        logger.log(level, '%s: %.3f s, %d rows, %d bytes', span.name, span.seconds, span.rows, span.bytes)
+    return sink
+
+
+def json_sink(path):
+    """Return sink that appends finished spans to a file as JSON lines."""
+    lock = threading.Lock()
+
+    def sink(span):
+        with lock, open(path, 'a') as f:
+            f.write(json.dumps(span.to_dict()) + '\n')
+    return sink
+
+
+def format_summary(summary):
+    """Return summary as text, one span or counter per line."""
+    lines = []
+    for name, total in summary['spans'].items():
+        line = '{}: {:.2f} s'.format(name, total['seconds'])
+        if total['calls'] > 1:
+            line += ' ({} calls)'.format(total['calls'])
+        if total['rows']:
+            line += ', {} rows'.format(total['rows'])
+        if total['bytes']:
+            line += ', {:.1f} MB'.format(total['bytes'] / 2 ** 20)
+        lines.append(line)
+    lines.extend('{}: {}'.format(name, n) for name, n in summary['counters'].items())
+    return '\n'.join(lines)
+
+
+#: Statistics of all loads in this process
+stats = Stats()
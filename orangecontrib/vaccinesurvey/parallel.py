@@ -0,0 +1,131 @@
+"""Conversion of many samples to a table in several processes"""
+import json
+from collections import Counter, OrderedDict
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+from Orange.data import Table
+
+from .instrumentation import stats
+from .resolwe import TableBuilder, SCHEMA_SLUG, sample_descriptor
+from .schema import Schema, get_schema
+
+# Smallest number of samples that `to_orange_table` and `download.download` (from a snapshot)
+# convert in several processes; None (the default) disables it. Shards are encoded as JSON in
+# the parent, which takes about as long as the serial conversion, so it does not pay off yet
+# (see benchmarks.bench_parallel).
+PARALLEL_THRESHOLD = None
+
+
+def use_parallel(n_samples):
+    """Return True if conversion in several processes is enabled for `n_samples` samples."""
+    return PARALLEL_THRESHOLD is not None and n_samples >= PARALLEL_THRESHOLD and (os.cpu_count() or 1) > 1
+
+
+def _context():
+    """Return context of processes that do not inherit the parent's threads (unlike forked ones).
+
+    The fork server imports this module once, so its workers start without importing Orange.
+    """
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('spawn')
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload([__name__])
+    return context
+
+
+def _parse_shard(shm_name, shape, start, stop, definition, shard, records=False):
+    """Convert samples `start:stop` into the same rows of X in shared memory.
+
+    Samples are given as JSON (`shard`) of their descriptors or, if `records`,
+    of raw values of records (records.SampleRecord). The schema is compiled from
+    its `definition` (slug, data, metas and version), since schemas registered
+    in the parent are not registered in the worker. Return metas (as an array
+    of strings), values of discrete columns in order of their codes, numbers
+    of malformed dates and whether values of time columns have time.
+    """
+    builder = TableBuilder(stop - start, Schema(*definition))
+    if records:
+        for values in json.loads(shard):
+            builder.append_values(values)
+    else:
+        for descriptor in json.loads(shard):
+            builder.append(descriptor)
+    X, metas, values = builder.columns()
+    shm = SharedMemory(name=shm_name)
+    try:
+        target = np.ndarray(shape, dtype=float, buffer=shm.buf)
+        target[start:stop] = X
+        del target
+    finally:
+        shm.close()
+    return (metas.astype(str), values, builder.malformed_dates,
+            [var.have_time for var in builder.domain().attributes if var.is_time])
+
+
+def to_orange_table_parallel(samples, processes=None, schema=SCHEMA_SLUG, values=None):
+    """Return table of samples (resdk Samples or their JSON) converted in `processes` processes
+    and numbers of malformed dates per column.
+
+    Samples are split into a shard per process. Each process converts its shard
+    with TableBuilder and writes the rows into X in shared memory. Values of
+    discrete variables are merged as in TableBuilder: known `values` keep
+    their codes and new values from all shards follow, sorted. Processes are
+    started by a fork server or spawned, and shards are sent as JSON.
+    """
+    return _to_table_parallel([sample_descriptor(sample) for sample in samples], False, processes, schema, values)
+
+
+def records_to_table_parallel(records, processes=None, schema=SCHEMA_SLUG, values=None):
+    """Return table of records (records.SampleRecord) converted in several processes; see to_orange_table_parallel."""
+    return _to_table_parallel([list(record.values) for record in records], True, processes, schema, values)
+
+
+def _to_table_parallel(rows, records, processes, schema, values):
+    processes = max(min(processes or os.cpu_count() or 1, len(rows)), 1)
+    schema = get_schema(schema)
+    definition = (schema.slug, schema.data, schema.metas, schema.version)
+    n_rows = len(rows)
+    # Known values of discrete columns (given and defined by the schema) keep their codes
+    _, _, known = TableBuilder(1, schema, values).columns()
+    n_columns = len(TableBuilder(1, schema).domain().attributes)
+    bounds = np.linspace(0, n_rows, processes + 1).astype(int)
+
+    with stats.span('parse_parallel') as span:
+        span.rows = n_rows
+        shm = SharedMemory(create=True, size=max(n_rows * n_columns * 8, 1))
+        try:
+            with ProcessPoolExecutor(processes, mp_context=_context()) as executor:
+                futures = [executor.submit(_parse_shard, shm.name, (n_rows, n_columns), start, stop, definition,
+                                           json.dumps(rows[start:stop]), records)
+                           for start, stop in zip(bounds, bounds[1:])]
+                shards = [future.result() for future in futures]
+            X = np.ndarray((n_rows, n_columns), dtype=float, buffer=shm.buf).copy()
+        finally:
+            shm.close()
+            shm.unlink()
+
+    with stats.span('table') as span:
+        span.rows = n_rows
+        merged = {}
+        for i in schema.discrete_columns:
+            name = schema.data[i][0]
+            merged[name] = known[i] + sorted(set().union(*(shard[1][i] for shard in shards)) - set(known[i]))
+            codes = {value: code for code, value in enumerate(merged[name])}
+            for start, stop, shard in zip(bounds, bounds[1:], shards):
+                lookup = np.array([codes[value] for value in shard[1][i]] or [0], dtype=float)
+                column = X[start:stop, i]
+                defined = ~np.isnan(column)
+                column[defined] = lookup[column[defined].astype(int)]
+
+        domain = TableBuilder(1, schema, merged).domain()
+        for j, var in enumerate(var for var in domain.attributes if var.is_time):
+            var.have_time = int(any(shard[3][j] for shard in shards))
+        malformed = Counter()
+        for shard in shards:
+            malformed.update(shard[2])
+        metas = np.concatenate([shard[0] for shard in shards]).astype(object)
+        return Table.from_numpy(domain, X, metas=metas), OrderedDict((name, malformed[name]) for name in shards[0][2])
@@ -0,0 +1,60 @@
+"""Compact records of samples"""
+import sys
+
+from .resolwe import SCHEMA_SLUG, sample_descriptor
+from .schema import get_schema
+
+
+class SampleRecord(object):
+    """Sample reduced to its id, last modification and raw values of schema's columns.
+
+    Values of data columns are followed by those of meta columns, as in
+    `Schema.parse`, but are not converted. Repeated values of discrete columns
+    are interned, so a record takes a fraction of the memory of resdk Sample or
+    its JSON, which carry the whole descriptor. Records give values by column
+    name with `get`, like a (flat) descriptor, so they can be passed to
+    `match_filters`.
+    """
+    __slots__ = ('id', 'modified', 'schema', 'values')
+
+    def __init__(self, id, modified, values, schema=SCHEMA_SLUG):
+        self.id = id
+        self.modified = modified
+        self.schema = get_schema(schema)
+        self.values = tuple(sys.intern(value) if isinstance(value, str) and i in self.schema.discrete_columns
+                            else value for i, value in enumerate(values))
+
+    @classmethod
+    def from_sample(cls, sample, schema=SCHEMA_SLUG):
+        """Return record of resdk Sample or of its JSON."""
+        schema = get_schema(schema)
+        descriptor = sample_descriptor(sample)
+        if isinstance(sample, dict):
+            id_, modified = sample['id'], sample.get('modified')
+        else:
+            id_, modified = sample.id, sample.modified
+        if hasattr(modified, 'isoformat'):
+            modified = modified.isoformat()
+        return cls(id_, modified, schema.values(descriptor) + schema.meta_values(descriptor), schema)
+
+    def get(self, name, default=None):
+        """Return value of column `name`."""
+        i = self.schema.index.get(name)
+        return default if i is None or self.values[i] is None else self.values[i]
+
+    def descriptor(self):
+        """Return `sample` descriptor group with the defined values."""
+        descriptor = {}
+        for var, value in zip(list(self.schema.data) + list(self.schema.metas), self.values):
+            if value is not None:
+                group = descriptor.setdefault(var[1]['group'], {}) if 'group' in var[1] else descriptor
+                group[var[0]] = value
+        return descriptor
+
+    def to_json(self):
+        """Return JSON of the sample with the descriptor of schema's columns."""
+        return {'id': self.id, 'modified': self.modified, 'descriptor': {'sample': self.descriptor()}}
+
+    def __repr__(self):
+        return 'SampleRecord({!r}, {!r}, {!r})'.format(self.id, self.modified, self.values)
+
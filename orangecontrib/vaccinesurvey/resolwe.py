@@ -1,11 +1,18 @@
 """Resolwe API"""
 import datetime
-from collections import OrderedDict
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
 
-import requests
-from resdk import Resolwe
+import numpy as np
 from Orange.data import ContinuousVariable, StringVariable, TimeVariable, DiscreteVariable, Domain, Table
 
+from .dates import parse_dates, age_in_years
+from .fastjson import loads, accept_encoding
+from .instrumentation import stats
+from .schema import register_schema, get_schema
+
 
 DATA = [
     ['sex', {'type': DiscreteVariable}],
@@ -32,54 +39,274 @@ DATA = [
 METAS = [
     ['study_code', {'type': StringVariable}],
 ]
+SCHEMA_SLUG = 'sample-vaccinesurvey'
+# Column derived from entry_date and birth_date
+AGE_AT_ENTRY = 'age_at_entry'
+# Sample filters and query parameters that apply them on the server
+FILTERS = OrderedDict([
+    ('village_code', 'descriptor__sample__village_code'),
+    ('study_code', 'descriptor__sample__study_code'),
+    ('entry_date_from', 'descriptor__sample__entry_date__gte'),
+    ('entry_date_to', 'descriptor__sample__entry_date__lte'),
+])
+PAGE_SIZE = 500
+# Parallel page requests (at most) and retries of a failed page request
+MAX_WORKERS = 8
+RETRIES = 3
+BACKOFF = 0.5
+# Seconds to wait for server's response to a page request
+TIMEOUT = 60
 
 
-def _parse_sample_descriptor(descriptor):
-    """Return a list of values from sample descriptor."""
-    data = []
-    for var in DATA:
-        value = None  # Prevent assigning previous value if current one is missing
-        if 'group' in var[1]:
-            if descriptor.get(var[1]['group'], None):
-                value = descriptor[var[1]['group']][var[0]]
-        else:
-            value = descriptor.get(var[0], None)
+register_schema(SCHEMA_SLUG, DATA, METAS)
+
+
+class TableBuilder(object):
+    """Build Orange.data.Table from sample descriptors in a single columnar pass.
+
+    Rows are written into preallocated X/metas arrays (grown by doubling when
+    full) and discrete values are interned into codes as they are seen, so the
+    finished table is made with `Table.from_numpy` without any rescans. Values
+    are taken from descriptors by getters and converters of the compiled schema.
+    Dates are kept as strings and converted in bulk, column by column, when the
+    table is made; if the schema has entry and birth dates, age at entry is added.
+
+    Values of discrete variables are sorted. Values known from previous loads
+    (`values`, a dict of lists by variable name) keep their order and only the
+    new ones are appended, so codes and the domain stay the same across loads.
+    Values defined by the schema (choices) are known as well.
+    """
 
-        # Format discrete and time variables:
-        if value is not None and var[1]['type'] in [DiscreteVariable, TimeVariable] and not isinstance(value, bool):
+    def __init__(self, size=1024, schema=SCHEMA_SLUG, values=None):
+        self.schema = get_schema(schema)
+        self.n_rows = 0
+        names = [var[0] for var in self.schema.data]
+        self._age = 'entry_date' in names and 'birth_date' in names
+        size = max(size, 1)
+        self._X = np.full((size, len(names) + self._age), np.nan)
+        self._metas = np.full((size, len(self.schema.metas)), StringVariable.Unknown, dtype=object)
+
+        # Discrete values (known ones first, the rest in order of appearance) mapped to their codes
+        self._codes = {}
+        self._known = {}
+        # Time variables and their columns; dates are stored as they come until converted in bulk
+        self._time_vars = OrderedDict()
+        converters = []
+        for i, var in enumerate(self.schema.data):
+            if var[1]['type'] == DiscreteVariable:
+                self._known[i] = list((values or {}).get(var[0], ()))
+                self._known[i] += [value for value in var[1].get('values', ()) if value not in self._known[i]]
+                self._codes[i] = OrderedDict((value, code) for code, value in enumerate(self._known[i]))
+                converters.append(self._discrete_converter(self._codes[i]))
+            elif var[1]['type'] == TimeVariable:
+                self._time_vars[i] = TimeVariable(var[0], have_date=1)
+                converters.append(lambda value: np.nan)
+            else:
+                converters.append(float)
+        self._converters = tuple(converters)
+        self._dates = np.full((size, len(self._time_vars)), None, dtype=object)
+        self._converted_rows = 0
+        self.malformed_dates = OrderedDict((var.name, 0) for var in self._time_vars.values())
+
+    @staticmethod
+    def _discrete_converter(codes):
+        def convert(value):
             value = str(value)
+            code = codes.get(value)
+            if code is None:
+                code = codes[value] = len(codes)
+            return code
+        return convert
 
-        data.append(value)
+    def _grow(self, size):
+        X = np.full((size, self._X.shape[1]), np.nan)
+        X[:self.n_rows] = self._X[:self.n_rows]
+        metas = np.full((size, self._metas.shape[1]), StringVariable.Unknown, dtype=object)
+        metas[:self.n_rows] = self._metas[:self.n_rows]
+        dates = np.full((size, self._dates.shape[1]), None, dtype=object)
+        dates[:self.n_rows] = self._dates[:self.n_rows]
+        self._X, self._metas, self._dates = X, metas, dates
 
-    metas = [descriptor.get(var[0], None) for var in METAS]
-    return data + metas
+    def append(self, descriptor):
+        """Append a row from sample descriptor."""
+        self.append_values(self.schema.values(descriptor), self.schema.meta_values(descriptor))
 
+    def append_values(self, values, meta_values=()):
+        """Append a row from raw values of data columns and of meta columns.
+
+        If `meta_values` are not given, they are expected to follow the data
+        columns in `values` (see records.SampleRecord).
+        """
+        if self.n_rows == self._X.shape[0]:
+            self._grow(2 * self.n_rows)
+
+        nan = np.nan
+        n_data = len(self._converters)
+        self._X[self.n_rows, :n_data] = [nan if value is None else convert(value)
+                                         for value, convert in zip(values, self._converters)]
+        for j, i in enumerate(self._time_vars):
+            self._dates[self.n_rows, j] = values[i]
+        for i, value in enumerate(meta_values or values[n_data:]):
+            if value is not None:
+                self._metas[self.n_rows, i] = value
+        self.n_rows += 1
+
+    def extend(self, descriptors):
+        with stats.span('parse') as span:
+            n_rows = self.n_rows
+            for descriptor in descriptors:
+                self.append(descriptor)
+            span.rows = self.n_rows - n_rows
+
+    def extend_records(self, records):
+        """Append rows from records (records.SampleRecord) of samples."""
+        with stats.span('parse') as span:
+            n_rows = self.n_rows
+            for record in records:
+                self.append_values(record.values)
+            span.rows = self.n_rows - n_rows
+
+    def _convert_dates(self):
+        """Convert dates of rows appended since the last conversion and compute age at entry."""
+        rows = slice(self._converted_rows, self.n_rows)
+        for j, (i, var) in enumerate(self._time_vars.items()):
+            self._X[rows, i], malformed, has_time = parse_dates(self._dates[rows, j], var)
+            self._dates[rows, j] = None
+            self.malformed_dates[var.name] += malformed
+            if has_time:
+                var.have_time = 1
+
+        if self._age:
+            names = [var[0] for var in self.schema.data]
+            self._X[rows, -1] = age_in_years(self._X[rows, names.index('entry_date')],
+                                             self._X[rows, names.index('birth_date')])
+        self._converted_rows = self.n_rows
+
+    def _values(self, i):
+        """Return values of i-th (discrete) column: known values followed by the new ones, sorted."""
+        known = self._known[i]
+        return known + sorted(list(self._codes[i])[len(known):])
+
+    def domain(self):
+        attributes = []
+        for i, var in enumerate(self.schema.data):
+            if i in self._codes:
+                attributes.append(DiscreteVariable(var[0], values=self._values(i)))
+            elif i in self._time_vars:
+                attributes.append(self._time_vars[i])
+            else:
+                attributes.append(var[1]['type'](var[0]))
+        if self._age:
+            attributes.append(ContinuousVariable(AGE_AT_ENTRY))
+        metas = [var[1]['type'](var[0]) for var in self.schema.metas]
+        return Domain(attributes, metas=metas)
+
+    def columns(self):
+        """Return X, metas and values of discrete columns (in order of their codes) by column index.
+
+        Discrete values in X are coded in order of appearance (unlike in `table`).
+        Dates are converted.
+        """
+        self._convert_dates()
+        return (self._X[:self.n_rows], self._metas[:self.n_rows],
+                {i: list(codes) for i, codes in self._codes.items()})
+
+    def table(self):
+        with stats.span('table') as span:
+            span.rows = self.n_rows
+            return self._table()
+
+    def _table(self):
+        self._convert_dates()
+        domain = self.domain()
+        X = self._X[:self.n_rows]
+
+        # Recode new discrete values from order of appearance to the sorted one
+        for i, codes in self._codes.items():
+            order = np.array([codes[value] for value in domain.attributes[i].values], dtype=float)
+            if np.any(order != np.arange(len(order))):
+                if X.base is self._X:
+                    X = X.copy()
+                column = X[:, i]
+                defined = ~np.isnan(column)
+                column[defined] = np.argsort(order)[column[defined].astype(int)]
+        return Table.from_numpy(domain, X, metas=self._metas[:self.n_rows])
 
-def to_orange_table(samples):
-    """Parse data from samples to Orange.data.Table"""
-    #  Create table and fill it with sample data:
-    table = []
-    for sample in samples:
-        table.append(_parse_sample_descriptor(sample.descriptor['sample']))
 
-    #  Create domain (header in table):
-    header = [var[1]['type'].make(var[0]) for var in DATA]
+def discrete_values(domain):
+    """Return values of discrete variables in domain by variable name (see TableBuilder)."""
+    return {var.name: list(var.values) for var in domain.variables if var.is_discrete}
 
-    # It is necessary to provide all possible values for dicrete variable with
-    # Iterate through all discrete variables in header:
-    for head_, i in [(var, i) for i, (var, dat) in enumerate(zip(header, DATA)) if dat[1]['type'] == DiscreteVariable]:
-        # Provide all possible values for discrete_var:
-        head_.values = list(set([sample[i] for sample in table]))
 
-    metas = [var[1]['type'].make(var[0]) for var in METAS]
-    return Table(Domain(header, metas=metas), table)
+def descriptor_fields(schema=SCHEMA_SLUG):
+    """Return fields of sample JSON needed for schema's columns (projection requested from the server)."""
+    schema = get_schema(schema)
+    fields = ['id', 'modified']
+    for var in list(schema.data) + list(schema.metas):
+        for group in [var[1].get('group')] + list(var[1].get('other_groups', ())):
+            path = [group, var[0]] if group is not None else [var[0]]
+            fields.append('__'.join(['descriptor', 'sample'] + path))
+    return fields
+
+
+def match_filters(descriptor, filters):
+    """Return True if sample descriptor (or SampleRecord) satisfies filters (see FILTERS); empty filters are ignored."""
+    for name, value in filters.items():
+        if not value:
+            continue
+        if name in ('village_code', 'study_code'):
+            if str(descriptor.get(name)) != str(value):
+                return False
+        else:
+            entry_date = descriptor.get('entry_date')
+            if entry_date is None:
+                return False
+            if name == 'entry_date_from' and str(entry_date) < value:
+                return False
+            if name == 'entry_date_to' and str(entry_date)[:len(value)] > value:
+                return False
+    return True
+
+
+def sample_descriptor(sample):
+    """Return `sample` descriptor group of resdk Sample or of its JSON."""
+    descriptor = sample['descriptor'] if isinstance(sample, dict) else sample.descriptor
+    return descriptor['sample']
+
+
+def to_orange_table(samples):
+    """Parse data from samples (resdk Samples or their JSON) to Orange.data.Table
+
+    If enabled (see parallel.PARALLEL_THRESHOLD), long lists are converted in
+    several processes (see parallel.to_orange_table_parallel).
+    """
+    from . import parallel
+    if isinstance(samples, list) and parallel.use_parallel(len(samples)):
+        return parallel.to_orange_table_parallel(samples)[0]
+    builder = TableBuilder(len(samples) if hasattr(samples, '__len__') else 1024)
+    builder.extend(sample_descriptor(sample) for sample in samples)
+    return builder.table()
 
 
 class ResolweAPI(object):
+    """Access to samples on Resolwe server.
+
+    Pages of samples are requested through a session with a pool of keep-alive
+    connections; if `http_cache` (httpcache.HTTPCache) is given, responses are
+    cached there and revalidated on each request. Samples are parsed with
+    `schema`, the key of a registered schema (see schema.SchemaRegistry).
+    """
+    schema = SCHEMA_SLUG
+
+    def __init__(self, user, password, url, http_cache=None):
+        # resdk and requests are slow to import, so they are loaded on first login
+        import requests
+        from resdk import Resolwe
+        from .httpcache import CachingAdapter
 
-    def __init__(self, user, password, url):
         try:
-            self._res = Resolwe(user, password, url)
+            with stats.span('login'):
+                self._res = Resolwe(user, password, url)
         except requests.exceptions.InvalidURL as e:
             raise ResolweServerException(e)
         except ValueError as e:  # TODO: is there a better way? resdk returns only ValueError
@@ -91,8 +318,134 @@ class ResolweAPI(object):
             else:
                 raise
 
-    def get_samples(self):
-        return self._res.sample.filter(descriptor_schema__slug='sample-vaccinesurvey')
+        # All page requests share one pool of keep-alive connections
+        self._session = requests.Session()
+        self._session.auth = self._res.auth
+        # Newer resdk keeps authentication cookies on its own session
+        if hasattr(self._res, 'session'):
+            self._session.cookies.update(self._res.session.cookies)
+        if http_cache is None:
+            adapter = requests.adapters.HTTPAdapter(pool_maxsize=MAX_WORKERS)
+        else:
+            adapter = CachingAdapter(http_cache, '{}\n{}'.format(url, user), pool_maxsize=MAX_WORKERS)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+        # Samples' JSON is repetitive, so compressed responses are several times smaller
+        self._session.headers['Accept-Encoding'] = accept_encoding()
+
+    @property
+    def url(self):
+        return self._res.url
+
+    def _sample_filters(self, modified_after=None, filters=None):
+        params = {'descriptor_schema__slug': get_schema(self.schema).slug}
+        if modified_after:
+            params['modified__gte'] = modified_after
+        for name, value in (filters or {}).items():
+            if value:
+                params[FILTERS[name]] = value
+        return params
+
+    def get_samples(self, modified_after=None):
+        """Return samples, optionally only those modified at or after `modified_after` (ISO timestamp)."""
+        with stats.span('get_samples') as span:
+            samples = list(self._res.sample.filter(**self._sample_filters(modified_after)))
+            span.rows = len(samples)
+        return samples
+
+    def _get_page(self, params, cancelled=None, path='/api/sample'):
+        """Return JSON of one page of samples (or of objects at `path`), retrying with exponential backoff on
+        connection and server errors.
+
+        Return None if `cancelled` (threading.Event) is set before the page is retrieved.
+        """
+        import requests
+        for attempt in range(RETRIES + 1):
+            if cancelled is not None and cancelled.is_set():
+                return None
+            try:
+                with stats.span('fetch_page') as span:
+                    response = self._session.get(urljoin(self._res.url, path), params=params, timeout=TIMEOUT)
+                    response.raise_for_status()
+                    # Pages are decoded directly from bytes, without resdk objects
+                    page = loads(response.content)
+                    span.bytes = len(response.content)
+                    span.rows = len(page if isinstance(page, list) else page['results'])
+                if hasattr(response, 'from_cache'):
+                    stats.count('http_cache.hit' if response.from_cache else 'http_cache.miss')
+                return page
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                    requests.exceptions.HTTPError) as e:
+                server_error = getattr(e.response, 'status_code', 500) >= 500
+                if attempt == RETRIES or not server_error:
+                    raise
+            if cancelled is None:
+                time.sleep(BACKOFF * 2 ** attempt)
+            else:
+                cancelled.wait(BACKOFF * 2 ** attempt)
+
+    def get_sample_pages(self, page_size=PAGE_SIZE, modified_after=None, workers=1, cancelled=None, filters=None,
+                         ids=None):
+        """Yield pages of samples' JSON: dicts with total `count` and page `results`.
+
+        Only fields needed for the table are transferred and `filters` (see
+        FILTERS) are applied on the server. If `ids` are given, only samples
+        with these ids are retrieved. Once the number of samples is known
+        from the first page, the rest are requested by up to `workers` threads
+        and yielded in order. Retrieval stops when `cancelled` (threading.Event)
+        is set.
+        """
+        params = dict(self._sample_filters(modified_after, filters), limit=page_size, ordering='id',
+                      fields=','.join(descriptor_fields(self.schema)))
+        if ids is not None:
+            params['id__in'] = ','.join(str(id_) for id_ in ids)
+        page = self._get_page(dict(params, offset=0), cancelled)
+        if page is None:
+            return
+        if isinstance(page, list):  # server does not paginate
+            yield {'count': len(page), 'results': page}
+            return
+        yield page
+        if not page.get('next') or not page['results']:
+            return
+
+        # The server may return fewer samples per page than requested
+        step = len(page['results'])
+        offsets = deque(range(step, page['count'], step))
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            pending = deque()
+            while offsets or pending:
+                while offsets and len(pending) < 2 * max(workers, 1):
+                    pending.append(executor.submit(self._get_page, dict(params, offset=offsets.popleft()), cancelled))
+                page = pending.popleft().result()
+                if page is None or (cancelled is not None and cancelled.is_set()):
+                    # Pages not requested yet are dropped; those being retrieved are waited for
+                    for future in pending:
+                        future.cancel()
+                    return
+                yield page
+
+    def get_data_version(self, filters=None):
+        """Return version of samples on the server (as `cache.data_version`) with a single one-sample request."""
+        params = dict(self._sample_filters(None, filters), limit=1, ordering='-modified', fields='id,modified')
+        page = self._get_page(params)
+        if isinstance(page, list):  # server does not paginate
+            page = {'count': len(page), 'results': sorted(page, key=lambda s: s.get('modified') or '')[-1:]}
+        modified = page['results'][0].get('modified') if page['results'] else None
+        return '{}:{}'.format(page['count'], modified or '')
+
+    def get_sample_ids(self):
+        """Return ids of all samples without retrieving their descriptors."""
+        return [sample['id'] for sample in
+                self._res.api.sample.get(descriptor_schema__slug=get_schema(self.schema).slug, fields='id')]
+
+    def get_descriptor_schemas(self, slug=SCHEMA_SLUG, fields=None):
+        """Return definitions (JSON) of all versions of descriptor schema `slug`, or only their `fields`."""
+        params = {'slug': slug}
+        if fields:
+            params['fields'] = fields
+        page = self._get_page(params, path='/api/descriptorschema')
+        return page if isinstance(page, list) else page['results']
 
 
 class ResolweCredentialsException(Exception):
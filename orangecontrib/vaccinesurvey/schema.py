@@ -0,0 +1,246 @@
+"""Descriptor schemas compiled into value getters"""
+import json
+import os
+import re
+import tempfile
+import threading
+
+from Orange.data import ContinuousVariable, DiscreteVariable, StringVariable, TimeVariable
+
+# Orange variables for types of descriptor fields (fields of other types are not loaded);
+# strings with choices are discrete
+FIELD_TYPES = {
+    'basic:boolean:': DiscreteVariable,
+    'basic:date:': TimeVariable,
+    'basic:datetime:': TimeVariable,
+    'basic:decimal:': ContinuousVariable,
+    'basic:integer:': ContinuousVariable,
+    'basic:string:': StringVariable,
+    'basic:text:': StringVariable,
+}
+
+
+def _getter(name, group=None, other_groups=()):
+    """Return function that gets value of field `name` (in `group`) from descriptor or None.
+
+    If the field is in other groups in other versions of the schema (`None`
+    for the top level), the value is taken from any of them.
+    """
+    if other_groups:
+        getters = [_getter(name, group)] + [_getter(name, other) for other in other_groups]
+
+        def get_any(descriptor):
+            for get in getters:
+                value = get(descriptor)
+                if value is not None:
+                    return value
+        return get_any
+
+    if group is None:
+        return lambda descriptor: descriptor.get(name)
+
+    def get(descriptor):
+        values = descriptor.get(group)
+        return values.get(name) if values else None
+    return get
+
+
+class Schema(object):
+    """Columns (DATA and METAS definitions) of a descriptor schema.
+
+    Each column is compiled once into a getter of its value from descriptor, so
+    no per-row checks of column definitions are needed when parsing samples.
+
+    Schemas derived from definitions on the server (see `schema_from_definitions`)
+    have a `version` and are registered under `key`, the slug and the version.
+    """
+
+    def __init__(self, slug, data, metas=(), version=None):
+        self.slug = slug
+        self.version = version
+        self.key = slug if version is None else '{}@{}'.format(slug, version)
+        self.data = data
+        self.metas = metas
+        self.getters = tuple(_getter(var[0], var[1].get('group'), var[1].get('other_groups', ()))
+                             for var in data)
+        self.meta_getters = tuple(_getter(var[0], var[1].get('group'), var[1].get('other_groups', ()))
+                                  for var in metas)
+        # Positions of data and meta columns (in this order) by name
+        self.index = {var[0]: i for i, var in enumerate(list(data) + list(metas))}
+        self.discrete_columns = frozenset(i for i, var in enumerate(data) if var[1]['type'] == DiscreteVariable)
+        # Discrete and time values are passed to Orange as strings
+        self._str_columns = tuple(i for i, var in enumerate(data) if var[1]['type'] in (DiscreteVariable, TimeVariable))
+
+    def values(self, descriptor):
+        """Return raw values of data columns from descriptor."""
+        return [get(descriptor) for get in self.getters]
+
+    def meta_values(self, descriptor):
+        return [get(descriptor) for get in self.meta_getters]
+
+    def parse(self, descriptor):
+        """Return a list of values (data and metas) from descriptor."""
+        data = self.values(descriptor)
+        for i in self._str_columns:
+            value = data[i]
+            if value is not None and not isinstance(value, bool):
+                data[i] = str(value)
+        return data + self.meta_values(descriptor)
+
+
+SCHEMAS = {}
+
+
+def register_schema(slug, data, metas=(), version=None):
+    """Compile and register schema for descriptor schema `slug`."""
+    schema = Schema(slug, data, metas, version)
+    SCHEMAS[schema.key] = schema
+    return schema
+
+
+def get_schema(key):
+    """Return schema registered under `key`; schemas are returned as they are."""
+    return key if isinstance(key, Schema) else SCHEMAS[key]
+
+
+def _version_key(version):
+    return [int(part) for part in re.findall(r'\d+', str(version))]
+
+
+def definition_columns(fields, group=None):
+    """Return columns of descriptor schema definition (fields as JSON) as tuples (name, group, type, values).
+
+    Fields of groups are included (with the name of their group) only for
+    groups on the top level.
+    """
+    columns = []
+    for field in fields:
+        if 'group' in field:
+            if group is None:
+                columns.extend(definition_columns(field['group'], field['name']))
+        elif field.get('type') in FIELD_TYPES:
+            values = [str(choice['value']) for choice in field.get('choices', ())]
+            var_type = DiscreteVariable if values else FIELD_TYPES[field['type']]
+            columns.append((field['name'], group, var_type, values))
+    return columns
+
+
+def _sample_fields(definition, root):
+    """Return fields of descriptor group `root` in schema definition (JSON from server)."""
+    for field in definition.get('schema') or ():
+        if field.get('name') == root and 'group' in field:
+            return field['group']
+    return definition.get('schema') or ()
+
+
+def schema_from_definitions(slug, definitions, defaults=None, root='sample'):
+    """Compile and register schema with columns of all versions of descriptor schema `slug`.
+
+    `definitions` are descriptor schemas (JSON from server) with 'version' and
+    'schema'; columns are fields of descriptor group `root`. Columns are matched
+    across versions by name: they are put into the group of the newest version
+    and values are also taken from groups of other versions. Samples are not
+    tied to the version they were described with, so the value of a column is
+    taken from the first of its groups that has it, and fields renamed between
+    versions are separate columns. Columns defined in `defaults` (Schema) keep
+    their type and order and come first; new columns follow in order of the
+    newest version. Strings are metas.
+    """
+    definitions = sorted(definitions, key=lambda definition: _version_key(definition.get('version')), reverse=True)
+    columns = {}
+    for definition in definitions:
+        for name, group, var_type, values in definition_columns(_sample_fields(definition, root)):
+            if name not in columns:
+                columns[name] = {'type': var_type, 'values': values, 'groups': []}
+            if group not in columns[name]['groups']:
+                columns[name]['groups'].append(group)
+
+    default_columns = list(defaults.data) + list(defaults.metas) if defaults is not None else []
+    names = [var[0] for var in default_columns if var[0] in columns]
+    names += [name for name in columns if name not in names]
+    types = {var[0]: var[1]['type'] for var in default_columns}
+    data, metas = [], []
+    for name in names:
+        column = columns[name]
+        var = [name, {'type': types.get(name, column['type'])}]
+        if column['groups'][0] is not None:
+            var[1]['group'] = column['groups'][0]
+        if column['groups'][1:]:
+            var[1]['other_groups'] = column['groups'][1:]
+        if column['values'] and var[1]['type'] == DiscreteVariable:
+            var[1]['values'] = column['values']
+        (metas if var[1]['type'] == StringVariable else data).append(var)
+
+    versions = '+'.join(str(definition.get('version')) for definition in reversed(definitions))
+    return register_schema(slug, data, metas, versions)
+
+
+class SchemaRegistry(object):
+    """Descriptor schemas of servers, with their definitions stored in a JSON file at `path`.
+
+    Versions of a descriptor schema are listed on the server on each `get`;
+    definitions are retrieved and compiled only when versions differ from the
+    stored ones, and compiled schemas are kept for the rest of the process.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._schemas = {}
+        # Schemas of several servers are retrieved at the same time (in federated downloads)
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self, content):
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(content, f)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def get(self, res, slug, defaults=None):
+        """Return schema `slug` on the server of `res` (ResolweAPI), registering it if it changed.
+
+        Raise the error of the request if the server does not list descriptor schemas.
+        """
+        key = '{}\n{}'.format(res.url, slug)
+        versions = sorted((definition['id'], str(definition.get('version')))
+                          for definition in res.get_descriptor_schemas(slug, fields='id,version'))
+        if not versions:
+            return defaults
+        versions = [list(version) for version in versions]
+        if key in self._schemas and self._schemas[key][0] == versions:
+            return self._schemas[key][1]
+
+        content = self._load()
+        stored = content.get(key)
+        if stored is None or stored['versions'] != versions:
+            stored = {'versions': versions, 'definitions': res.get_descriptor_schemas(slug)}
+            # The file is read again, as schemas of other servers may have been stored meanwhile
+            with self._lock:
+                content = self._load()
+                content[key] = stored
+                self._save(content)
+        schema = schema_from_definitions(slug, stored['definitions'], defaults)
+        self._schemas[key] = versions, schema
+        return schema
+
+    def latest(self, url, slug, defaults=None):
+        """Return schema `slug` of server at `url` as stored last, without contacting the server.
+
+        Return `defaults` if there is none.
+        """
+        stored = self._load().get('{}\n{}'.format(url, slug))
+        if stored is None:
+            return defaults
+        return schema_from_definitions(slug, stored['definitions'], defaults)
@@ -0,0 +1,59 @@
+"""Reuse of authenticated Resolwe sessions"""
+import hashlib
+import os
+import threading
+import time
+
+from .instrumentation import stats
+from .resolwe import ResolweAPI
+
+# Seconds after which a session is logged in again
+SESSION_MAX_AGE = 8 * 3600
+
+
+class SessionManager(object):
+    """Keep logged-in ResolweAPI instances by server url and user.
+
+    Sessions are shared by all widgets in the process and reused as long as
+    the password matches (only its salted hash is kept) and they are younger
+    than `max_age` seconds.
+    """
+
+    def __init__(self, max_age=SESSION_MAX_AGE):
+        self.max_age = max_age
+        self._sessions = {}
+        self._salt = os.urandom(16)
+        self._lock = threading.Lock()
+
+    def _digest(self, password):
+        return hashlib.sha256(self._salt + password.encode('utf-8')).digest()
+
+    def get(self, user, password, url, http_cache=None):
+        """Return ResolweAPI logged in as `user`, reusing an existing session if possible."""
+        key = (url, user)
+        with self._lock:
+            session = self._sessions.get(key)
+        if session is not None:
+            res, digest, created = session
+            if digest == self._digest(password) and time.monotonic() - created < self.max_age:
+                stats.count('session.reuse')
+                return res
+
+        res = ResolweAPI(user, password, url, http_cache)
+        stats.count('session.login')
+        with self._lock:
+            self._sessions[key] = (res, self._digest(password), time.monotonic())
+        return res
+
+    def invalidate(self, url, user):
+        """Forget session (e.g. when the server rejects it)."""
+        with self._lock:
+            self._sessions.pop((url, user), None)
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+
+
+#: Sessions shared by widgets in this process
+sessions = SessionManager()
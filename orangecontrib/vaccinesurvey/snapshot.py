@@ -0,0 +1,141 @@
+"""Columnar snapshots of converted tables for distribution and opening without a server
+
+A snapshot is a zip file with the domain and information about the data
+(such as server and data version) in `snapshot.json`, the data columns in
+`X.npy` and each meta column in `metas/<i>.npy`. Unless compressed, X is
+stored aligned in the file, so it is memory-mapped when the snapshot is opened;
+meta columns (strings) are always compressed.
+"""
+import json
+import os
+import struct
+import tempfile
+import zipfile
+
+import numpy as np
+from Orange.data import ContinuousVariable, DiscreteVariable, StringVariable, TimeVariable, Domain, Table
+
+from .instrumentation import stats
+
+FORMAT = 1
+EXTENSION = '.vss'
+#  alignment of X in file (an extra field of its zip header pads it, as in Android's zipalign)
+ALIGNMENT = 64
+ALIGNMENT_FIELD = 0xD935
+
+
+def _variable_to_json(var):
+    if var.is_discrete:
+        return {'type': 'discrete', 'name': var.name, 'values': list(var.values)}
+    elif var.is_time:
+        return {'type': 'time', 'name': var.name, 'have_date': var.have_date, 'have_time': var.have_time}
+    elif var.is_continuous:
+        return {'type': 'continuous', 'name': var.name}
+    return {'type': 'string', 'name': var.name}
+
+
+def _variable_from_json(var):
+    if var['type'] == 'discrete':
+        return DiscreteVariable(var['name'], values=var['values'])
+    elif var['type'] == 'time':
+        return TimeVariable(var['name'], have_date=var['have_date'], have_time=var['have_time'])
+    elif var['type'] == 'continuous':
+        return ContinuousVariable(var['name'])
+    return StringVariable(var['name'])
+
+
+def _write_array(archive, name, array, compress, align=False):
+    info = zipfile.ZipInfo(name, date_time=(1980, 1, 1, 0, 0, 0))
+    info.compress_type = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+    if align:
+        # Local header is 30 bytes, followed by the name and the extra field
+        start = archive.fp.tell() + 30 + len(name.encode('utf-8')) + 4
+        info.extra = struct.pack('<HH', ALIGNMENT_FIELD, -start % ALIGNMENT) + b'\0' * (-start % ALIGNMENT)
+    with archive.open(info, 'w', force_zip64=array.nbytes > 2 ** 31) as f:
+        np.lib.format.write_array(f, array, allow_pickle=False)
+
+
+def save_snapshot(path, table, compress=False, **info):
+    """Write table to snapshot at `path`; `info` (JSON serializable) is stored with it.
+
+    If `compress` is set, X is compressed as well; the file is smaller, but X
+    is read into memory when the snapshot is opened.
+    """
+    with stats.span('save_snapshot') as span:
+        span.rows = len(table)
+        content = {
+            'format': FORMAT,
+            'rows': len(table),
+            'attributes': [_variable_to_json(var) for var in table.domain.attributes],
+            'metas': [_variable_to_json(var) for var in table.domain.metas],
+            'info': info,
+        }
+        # A temporary file of its own, as the widget and the command line may save the same snapshot
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+        os.close(fd)
+        try:
+            with zipfile.ZipFile(tmp_path, 'w') as archive:
+                _write_array(archive, 'X.npy', np.ascontiguousarray(table.X, dtype=float), compress,
+                             align=not compress)
+                for i, var in enumerate(table.domain.metas):
+                    column = table.metas[:, i]
+                    if var.is_string:
+                        column = np.array(['' if value is None else str(value) for value in column], dtype=str)
+                    else:
+                        column = column.astype(float)
+                    _write_array(archive, 'metas/{}.npy'.format(i), column, compress=True)
+                archive.writestr('snapshot.json', json.dumps(content), zipfile.ZIP_DEFLATED)
+            # Snapshots are shared, so they are readable by others unlike temporary files
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        span.bytes = os.path.getsize(path)
+
+
+def _map_array(path, archive, name):
+    """Memory-map uncompressed array `name` from zip file at `path` (copy on write)."""
+    member = archive.getinfo(name)
+    with open(path, 'rb') as f:
+        f.seek(member.header_offset)
+        header = f.read(30)
+        name_length, extra_length = struct.unpack('<HH', header[26:30])
+        f.seek(member.header_offset + 30 + name_length + extra_length)
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+    if not shape or not all(shape):
+        return np.empty(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='c', offset=offset, shape=shape, order='F' if fortran_order else 'C')
+
+
+def load_snapshot(path, mmap=True):
+    """Return the table and the information stored in snapshot at `path`.
+
+    Raise ValueError if the file is not a snapshot.
+    """
+    with stats.span('load_snapshot') as span:
+        try:
+            with zipfile.ZipFile(path) as archive:
+                content = json.loads(archive.read('snapshot.json').decode('utf-8'))
+                if content.get('format') != FORMAT:
+                    raise ValueError('Unsupported snapshot format: {}'.format(content.get('format')))
+                if mmap and archive.getinfo('X.npy').compress_type == zipfile.ZIP_STORED:
+                    X = _map_array(path, archive, 'X.npy')
+                else:
+                    with archive.open('X.npy') as f:
+                        X = np.lib.format.read_array(f)
+                metas = np.empty((content['rows'], len(content['metas'])), dtype=object)
+                for i in range(len(content['metas'])):
+                    with archive.open('metas/{}.npy'.format(i)) as f:
+                        metas[:, i] = np.lib.format.read_array(f).astype(object)
+        except (zipfile.BadZipFile, KeyError) as e:
+            raise ValueError('Not a snapshot: {}'.format(e))
+        domain = Domain([_variable_from_json(var) for var in content['attributes']],
+                        metas=[_variable_from_json(var) for var in content['metas']])
+        span.rows = len(X)
+        return Table.from_numpy(domain, X, metas=metas), content['info']
@@ -0,0 +1,122 @@
+"""Incremental synchronization of samples"""
+import json
+import os
+import tempfile
+
+from .fastjson import loads
+from .instrumentation import stats
+from .records import SampleRecord
+from .resolwe import PAGE_SIZE, SCHEMA_SLUG
+
+
+class SampleSnapshot(object):
+    """Local copy of samples keyed by id together with last-modified watermark.
+
+    On `sync` only samples modified since the watermark are retrieved and merged
+    into the snapshot. Deleted samples, and samples missing in the snapshot
+    even though they are older than the watermark (e.g. made visible later),
+    are found with an id-only listing.
+    Samples are kept as compact records (records.SampleRecord).
+    """
+
+    def __init__(self, samples=None, watermark=None, schema=SCHEMA_SLUG):
+        self.samples = samples or {}
+        self.watermark = watermark
+        self.schema = schema
+
+    def __len__(self):
+        return len(self.samples)
+
+    def merge(self, samples):
+        """Add or replace samples and advance the watermark. Return the number of merged samples."""
+        n_merged = 0
+        for sample in samples:
+            if not isinstance(sample, SampleRecord):
+                sample = SampleRecord.from_sample(sample, self.schema)
+            self.samples[sample.id] = sample
+            if sample.modified and (self.watermark is None or sample.modified > self.watermark):
+                self.watermark = sample.modified
+            n_merged += 1
+        return n_merged
+
+    def prune(self, ids):
+        """Remove samples whose ids are not in `ids`. Return the number of removed samples."""
+        ids = set(ids)
+        removed = [id_ for id_ in self.samples if id_ not in ids]
+        for id_ in removed:
+            del self.samples[id_]
+        return len(removed)
+
+    def sync(self, res, page_size=PAGE_SIZE, workers=1, cancelled=None, on_page=None):
+        """Bring the snapshot up to date with the server (ResolweAPI).
+
+        After each retrieved page, `on_page` is called with the number of
+        changed samples on the server and records of the page.
+        """
+        with stats.span('sync') as span:
+            changed = 0
+            for page in res.get_sample_pages(page_size, modified_after=self.watermark, workers=workers,
+                                             cancelled=cancelled):
+                records = [SampleRecord.from_sample(sample, self.schema) for sample in page['results']]
+                changed += self.merge(records)
+                if on_page is not None:
+                    on_page(page['count'], records)
+            if cancelled is not None and cancelled.is_set():
+                return changed, 0
+            ids = res.get_sample_ids()
+            removed = self.prune(ids)
+            missing = [id_ for id_ in ids if id_ not in self.samples]
+            # Ids are listed in the query string, so missing samples are requested a page at a time
+            for i in range(0, len(missing), page_size):
+                for page in res.get_sample_pages(page_size, workers=workers, cancelled=cancelled,
+                                                 ids=missing[i:i + page_size]):
+                    changed += self.merge(page['results'])
+                if cancelled is not None and cancelled.is_set():
+                    return changed, removed
+            span.rows = changed
+        return changed, removed
+
+    def records(self):
+        """Return records of samples ordered by id."""
+        return [self.samples[id_] for id_ in sorted(self.samples)]
+
+    def to_list(self):
+        """Return samples (JSON) ordered by id."""
+        return [record.to_json() for record in self.records()]
+
+    def save(self, path):
+        # A temporary file of its own, as the same snapshot may be saved by the widget and the command line
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'watermark': self.watermark, 'schema': self.schema,
+                           'records': [[r.id, r.modified, r.values] for r in self.records()]}, f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path, schema=None):
+        """Load snapshot from `path`; return an empty snapshot if it does not exist or is unreadable.
+
+        If `schema` (key of a registered schema) is given and the snapshot was
+        saved with another schema, return an empty snapshot for `schema`, as
+        records of different schemas have different columns. Snapshots saved
+        with samples' JSON (before records) are converted.
+        """
+        try:
+            with open(path, 'rb') as f:
+                content = loads(f.read())
+        except (OSError, ValueError):
+            return cls(schema=schema or SCHEMA_SLUG)
+        if schema is not None and content.get('schema', SCHEMA_SLUG) != schema:
+            return cls(schema=schema)
+        snapshot = cls(watermark=content['watermark'], schema=content.get('schema', SCHEMA_SLUG))
+        if 'records' in content:
+            snapshot.samples = {id_: SampleRecord(id_, modified, values, snapshot.schema)
+                                for id_, modified, values in content['records']}
+        else:
+            snapshot.merge(content['samples'])
+            snapshot.watermark = content['watermark']
+        return snapshot
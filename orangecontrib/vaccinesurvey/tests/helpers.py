@@ -0,0 +1,36 @@
+"""Samples and a fake server shared by the tests"""
+from orangecontrib.vaccinesurvey.resolwe import SCHEMA_SLUG, match_filters, sample_descriptor
+
+
+def sample(id_, modified='2016-01-01T10:00:00', **descriptor):
+    """Return JSON of a sample with `descriptor` as its `sample` descriptor group."""
+    return {'id': id_, 'modified': modified, 'descriptor': {'sample': descriptor}}
+
+
+class FakeResolweAPI(object):
+    """ResolweAPI that serves `samples` (JSON) and records `modified_after` (or `ids`) of each retrieval of sample
+    pages."""
+    url = 'http://server'
+    schema = SCHEMA_SLUG
+
+    def __init__(self, samples=()):
+        self.samples = list(samples)
+        self.requested = []
+
+    @property
+    def downloads(self):
+        return len(self.requested)
+
+    def get_sample_pages(self, page_size, modified_after=None, ids=None, **kwargs):
+        self.requested.append(modified_after if ids is None else ids)
+        samples = [s for s in self.samples if (modified_after is None or s['modified'] >= modified_after) and
+                   (ids is None or s['id'] in ids)]
+        for i in range(0, len(samples), page_size):
+            yield {'count': len(samples), 'results': samples[i:i + page_size]}
+
+    def get_sample_ids(self):
+        return [s['id'] for s in self.samples]
+
+    def get_data_version(self, filters=None):
+        samples = [s for s in self.samples if match_filters(sample_descriptor(s), filters or {})]
+        return '{}:{}'.format(len(samples), max((s['modified'] for s in samples), default=''))
@@ -0,0 +1,67 @@
+import tempfile
+import unittest
+
+import numpy as np
+
+from orangecontrib.vaccinesurvey.cache import TableCache, data_version, content_hash
+from orangecontrib.vaccinesurvey.resolwe import to_orange_table
+from orangecontrib.vaccinesurvey.validation import validate
+
+
+SAMPLES = [
+    {'id': 1, 'modified': '2016-01-01T10:00:00',
+     'descriptor': {'sample': {'study_code': 'S1', 'sex': 'F', 'body_temp': 37.5}}},
+    {'id': 2, 'modified': '2016-01-02T10:00:00',
+     'descriptor': {'sample': {'study_code': 'S2', 'sex': 'M'}}},
+]
+
+
+class TableCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = TableCache(self.tmp.name)
+        self.table = to_orange_table(SAMPLES)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_data_version(self):
+        self.assertEqual(data_version(SAMPLES), '2:2016-01-02T10:00:00')
+        self.assertEqual(data_version(SAMPLES[1:], data_version(SAMPLES[:1])), '2:2016-01-02T10:00:00')
+        self.assertEqual(data_version([]), '0:')
+
+    def test_content_hash(self):
+        self.assertEqual(content_hash(self.table), content_hash(to_orange_table(SAMPLES)))
+        self.assertNotEqual(content_hash(self.table), content_hash(to_orange_table(SAMPLES[:1])))
+
+    def test_save_load(self):
+        self.assertIsNone(self.cache.load_latest('http://a', 'schema'))
+        self.cache.save('http://a', 'schema', 'v1', self.table)
+
+        version, table = self.cache.load_latest('http://a', 'schema')
+        self.assertEqual(version, 'v1')
+        self.assertEqual(table.domain, self.table.domain)
+        np.testing.assert_array_equal(table.X, self.table.X)
+        np.testing.assert_array_equal(table.metas, self.table.metas)
+        self.assertIsInstance(table.X.base, np.memmap)
+        self.assertEqual(content_hash(table), content_hash(self.table))
+
+        self.assertIsNotNone(self.cache.load('http://a', 'schema', 'v1'))
+        self.assertIsNone(self.cache.load('http://a', 'schema', 'v2'))
+        self.assertIsNone(self.cache.load_latest('http://b', 'schema'))
+
+    def test_evict(self):
+        for version in ('v1', 'v2', 'v3'):
+            self.cache.save('http://a', 'schema', version, self.table)
+        self.assertEqual(self.cache.load_latest('http://a', 'schema')[0], 'v3')
+        self.assertIsNone(self.cache.load('http://a', 'schema', 'v1'))
+
+    def test_validated(self):
+        table, _ = validate(self.table)
+        self.cache.save('http://a', 'schema', 'v1', table)
+        loaded = self.cache.load('http://a', 'schema', 'v1')
+        self.assertEqual(loaded.domain, table.domain)
+        self.assertEqual(loaded.metas.tolist(), table.metas.tolist())
+        self.assertEqual(loaded[0]['duplicate study_code'], 'no')
+        self.assertEqual(content_hash(loaded), content_hash(table))
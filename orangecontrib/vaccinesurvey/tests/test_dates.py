@@ -0,0 +1,64 @@
+import unittest
+
+import numpy as np
+from Orange.data import TimeVariable
+
+from orangecontrib.vaccinesurvey.dates import parse_dates, age_in_years
+from orangecontrib.vaccinesurvey.resolwe import TableBuilder
+
+
+class DatesTests(unittest.TestCase):
+
+    def test_parse_dates(self):
+        values, malformed, has_time = parse_dates(['2016-01-02', None, '2016-01-02'])
+        np.testing.assert_array_equal(values, [1451692800, np.nan, 1451692800])
+        self.assertEqual((malformed, has_time), (0, False))
+
+        values, malformed, has_time = parse_dates(['1970-01-02T00:00:10', 'not a date', 'not a date'])
+        np.testing.assert_array_equal(values, [86410, np.nan, np.nan])
+        self.assertEqual((malformed, has_time), (2, True))
+
+        values, malformed, _ = parse_dates([None, None])
+        self.assertTrue(np.isnan(values).all())
+        self.assertEqual(malformed, 0)
+
+        # Empty strings are missing, NaT is malformed
+        values, malformed, has_time = parse_dates(['', '2016-01-02', 'NaT', None])
+        np.testing.assert_array_equal(values, [np.nan, 1451692800, np.nan, np.nan])
+        self.assertEqual((malformed, has_time), (1, False))
+
+        values, malformed, has_time = parse_dates(['NaT', 'not a date', '2016-01-02'])
+        np.testing.assert_array_equal(values, [np.nan, np.nan, 1451692800])
+        self.assertEqual((malformed, has_time), (2, False))
+
+    def test_compact_dates(self):
+        # NumPy would read '20160101' as year 20160101
+        values, malformed, _ = parse_dates(['20160101', '2016-01-02'], TimeVariable('entry_date'))
+        np.testing.assert_array_equal(values, [1451606400, 1451692800])
+        self.assertEqual(malformed, 0)
+
+        values, malformed, _ = parse_dates(['20160101', '2016'])
+        self.assertTrue(np.isnan(values).all())
+        self.assertEqual(malformed, 2)
+
+    def test_age_in_years(self):
+        self.assertAlmostEqual(age_in_years(365.25 * 24 * 3600 * 10, 0), 10)
+
+    def test_table_builder(self):
+        builder = TableBuilder()
+        builder.append({'entry_date': '2016-01-01', 'birth_date': '2006-01-01'})
+        builder.append({'entry_date': '2016-13-01', 'birth_date': '2006-01-01'})
+        table = builder.table()
+        self.assertEqual(builder.malformed_dates, {'entry_date': 1, 'birth_date': 0})
+        self.assertAlmostEqual(table[0]['age_at_entry'], 10, places=1)
+        self.assertTrue(np.isnan(table[1]['age_at_entry']))
+        self.assertEqual(str(table[0]['entry_date']), '2016-01-01')
+
+    def test_empty_date(self):
+        builder = TableBuilder()
+        builder.append({'entry_date': '', 'birth_date': '2006-01-01'})
+        builder.append({'entry_date': '2016-01-01', 'birth_date': '2006-01-01'})
+        table = builder.table()
+        self.assertEqual(builder.malformed_dates, {'entry_date': 0, 'birth_date': 0})
+        self.assertTrue(np.isnan(table[0]['age_at_entry']))
+        self.assertFalse(table.domain['entry_date'].have_time)
@@ -0,0 +1,130 @@
+import csv
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from Orange.data import Table
+
+from orangecontrib.vaccinesurvey import download, export
+from orangecontrib.vaccinesurvey.cache import TableCache
+from orangecontrib.vaccinesurvey.resolwe import SCHEMA_SLUG, TableBuilder
+from orangecontrib.vaccinesurvey.snapshot import load_snapshot
+from orangecontrib.vaccinesurvey.tests import helpers
+from orangecontrib.vaccinesurvey.tests.helpers import FakeResolweAPI
+
+
+def sample(id_, village_code):
+    return helpers.sample(id_, '2016-01-0{}T10:00:00'.format(id_), study_code='S{}'.format(id_),
+                          village_code=village_code)
+
+
+class ExportTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.res = FakeResolweAPI([sample(1, 'V1'), sample(2, 'V2'), sample(3, 'V1')])
+        self.patches = [
+            patch.object(download, 'cache_path', self.tmp.name),
+            patch.object(export, 'table_cache', TableCache(os.path.join(self.tmp.name, 'tables'))),
+            patch.object(export, 'get_http_cache', lambda: None),
+            patch.object(export.sessions, 'get', lambda *args: self.res),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        self.tmp.cleanup()
+
+    def test_snapshot(self):
+        output = os.path.join(self.tmp.name, 'cohort.vss')
+        self.assertEqual(export.main(['--url', 'http://a', '--user', 'u', '--password', 'p', '--output', output,
+                                      '--page-size', '2', '--village-code', 'V1']), 0)
+        table, info = load_snapshot(output)
+        self.assertEqual(list(table.get_column('study_code')), ['S1', 'S3'])
+        self.assertEqual(info['url'], 'http://a')
+
+        # Unchanged data is taken from the table cache
+        self.assertEqual(export.export_samples(output, 'http://a', 'u', 'p', filters={'village_code': 'V1'}), 2)
+        self.assertEqual(self.res.downloads, 1)
+
+    def test_filter_ignored_by_server(self):
+        # The server ignores filters, which are applied locally
+        version = self.res.get_data_version()
+        self.res.get_data_version = lambda filters=None: version
+        for _ in range(2):
+            self.assertEqual(export.load_samples('http://a', 'u', 'p', filters={'village_code': 'V1'})[0], version)
+        self.assertEqual(self.res.downloads, 1)
+
+    def test_keeps_discrete_values(self):
+        # Table stored last by the widget, with values in the order they were seen
+        builder = TableBuilder(values={'village_code': ['V3', 'V2']})
+        export.table_cache.save('http://a', SCHEMA_SLUG, 'old', builder.table())
+        _, table = export.load_samples('http://a', 'u', 'p')
+        self.assertEqual(table.domain['village_code'].values, ('V3', 'V2', 'V1'))
+
+    def test_csv(self):
+        output = os.path.join(self.tmp.name, 'cohort.csv')
+        self.assertEqual(export.export_samples(output, 'http://a', 'u', 'p', page_size=2, incremental=False), 3)
+        with open(output) as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual([(row['id'], row['village_code'], row['sex']) for row in rows],
+                         [('1', 'V1', ''), ('2', 'V2', ''), ('3', 'V1', '')])
+
+    def test_tab_twice(self):
+        output = os.path.join(self.tmp.name, 'cohort.tab')
+        for _ in range(2):
+            self.assertEqual(export.export_samples(output, 'http://a', 'u', 'p'), 3)
+            table = Table.from_file(output)
+            self.assertEqual(list(table.get_column('study_code')), ['S1', 'S2', 'S3'])
+            self.assertEqual(table[0]['duplicate study_code'], 'no')
+        self.assertEqual(self.res.downloads, 1)
+
+    def test_failed_write_keeps_output(self):
+        output = os.path.join(self.tmp.name, 'cohort.tab')
+        with open(output, 'w') as f:
+            f.write('previous export')
+        def save(table, path):
+            with open(path, 'w') as f:
+                f.write('header only')
+            raise OSError('disk full')
+
+        with patch.object(Table, 'save', save):
+            self.assertEqual(export.main(['--url', 'http://a', '--user', 'u', '--password', 'p',
+                                          '--output', output]), 1)
+        with open(output) as f:
+            self.assertEqual(f.read(), 'previous export')
+        self.assertNotIn('cohort.tmp.tab', os.listdir(self.tmp.name))
+
+    def test_first_snapshot_sync_pages(self):
+        snapshot = os.path.join(self.tmp.name, 'snapshot.json')
+        pages = []
+
+        def on_page(done, count, builder):
+            pages.append((done, count, builder.n_rows))
+
+        version, table, _ = download.download(self.res, snapshot, 2, filters={'village_code': 'V1'}, on_page=on_page)
+        # Samples are converted while the empty snapshot is synchronized
+        self.assertEqual(pages, [(2, 3, 1), (3, 3, 2)])
+        self.assertEqual(list(table.get_column('study_code')), ['S1', 'S3'])
+        self.assertEqual(version, self.res.get_data_version({'village_code': 'V1'}))
+
+        # Samples removed from the server during the first synchronization are not in the table
+        os.remove(snapshot)
+        self.res.get_sample_ids = lambda: [1, 2]
+        _, table, _ = download.download(self.res, snapshot, 2)
+        self.assertEqual(list(table.get_column('study_code')), ['S1', 'S2'])
+
+    def test_snapshot_converted_in_processes(self):
+        snapshot = os.path.join(self.tmp.name, 'snapshot.json')
+        version, expected, _ = download.download(self.res, snapshot, 2, filters={'village_code': 'V1'})
+        with patch.object(download.parallel, 'use_parallel', lambda n: True):
+            self.assertEqual(download.download(self.res, snapshot, 2, filters={'village_code': 'V1'})[0], version)
+            _, table, malformed = download.download(self.res, snapshot, 2, values={'village_code': ['V2']})
+        self.assertEqual(list(expected.get_column('study_code')), ['S1', 'S3'])
+        self.assertEqual(list(table.get_column('study_code')), ['S1', 'S2', 'S3'])
+        self.assertEqual(table.domain['village_code'].values, ('V2', 'V1'))
+        self.assertEqual(table[0]['duplicate study_code'], 'no')
+        self.assertEqual(malformed['entry_date'], 0)
@@ -0,0 +1,26 @@
+import unittest
+from unittest.mock import patch
+
+from orangecontrib.vaccinesurvey import fastjson
+
+
+class FastJSONTests(unittest.TestCase):
+
+    def test_loads(self):
+        content = {'count': 1, 'results': [{'id': 1, 'descriptor': {'sample': {'name': 'Čšž'}}}]}
+        text = '{"count": 1, "results": [{"id": 1, "descriptor": {"sample": {"name": "Čšž"}}}]}'
+        self.assertEqual(fastjson.loads(text.encode('utf-8')), content)
+        self.assertEqual(fastjson.loads(text), content)
+        with patch.object(fastjson, 'orjson', None):
+            self.assertEqual(fastjson.loads(text.encode('utf-8')), content)
+            with self.assertRaises(ValueError):
+                fastjson.loads(b'{')
+        with self.assertRaises(ValueError):
+            fastjson.loads(b'{')
+
+    def test_accept_encoding(self):
+        self.assertIn('gzip', fastjson.accept_encoding().split(','))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+
+import numpy as np
+
+from orangecontrib.vaccinesurvey.federation import merge_tables
+from orangecontrib.vaccinesurvey.resolwe import to_orange_table
+
+
+def sample(id_, study_code, village_code, ama1=None):
+    descriptor = {'study_code': study_code, 'village_code': village_code, 'entry_date': '2016-01-01'}
+    if ama1 is not None:
+        descriptor['immunological_data'] = {'ama1': ama1}
+    return {'id': id_, 'descriptor': {'sample': descriptor}}
+
+
+class MergeTablesTests(unittest.TestCase):
+
+    def test_merge(self):
+        north = to_orange_table([sample(1, 'A1', 'V2', 0.5), sample(2, 'A2', 'V1')])
+        south = to_orange_table([sample(1, 'B1', 'V3', 1.5), sample(2, 'A2', 'V2'), sample(3, None, 'V1')])
+        table = merge_tables([('http://north', north), ('http://south', south)])
+
+        self.assertEqual(len(table), 4)
+        self.assertEqual(list(table.domain['village_code'].values), ['V1', 'V2', 'V3'])
+        self.assertEqual(list(table.domain['server'].values), ['http://north', 'http://south'])
+        self.assertEqual([str(row['village_code']) for row in table], ['V2', 'V1', 'V3', 'V1'])
+        self.assertEqual([str(row['server']) for row in table],
+                         ['http://north', 'http://north', 'http://south', 'http://south'])
+        self.assertEqual(list(table.get_column('study_code')), ['A1', 'A2', 'B1', ''])
+        np.testing.assert_equal(table.get_column('ama1'), [0.5, np.nan, 1.5, np.nan])
+
+    def test_empty(self):
+        table = merge_tables([('http://north', to_orange_table([]))])
+        self.assertEqual(len(table), 0)
+        self.assertIn('server', table.domain)
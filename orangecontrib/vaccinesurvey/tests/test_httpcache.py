@@ -0,0 +1,70 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+
+from orangecontrib.vaccinesurvey.httpcache import HTTPCache, CachingAdapter
+
+
+class FakeServer(object):
+    """Answer with 304 when request's If-None-Match matches the current ETag."""
+
+    def __init__(self):
+        self.etag, self.body, self.requests = '"1"', b'{"count": 1}', []
+
+    def send(self, request):
+        self.requests.append(request)
+        response = Response()
+        response.request, response.url = request, request.url
+        if request.headers.get('If-None-Match') == self.etag:
+            response.status_code, response._content = 304, b''
+        else:
+            response.status_code, response._content = 200, self.body
+        response.headers = CaseInsensitiveDict({'ETag': self.etag, 'Content-Type': 'application/json'})
+        return response
+
+
+class HTTPCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = HTTPCache(os.path.join(self.tmp.name, 'http.sqlite'), max_size=100)
+
+    def tearDown(self):
+        self.cache._db.close()
+        self.tmp.cleanup()
+
+    def test_revalidation(self):
+        server = FakeServer()
+        session = requests.Session()
+        session.mount('http://', CachingAdapter(self.cache, 'user'))
+        with patch.object(HTTPAdapter, 'send', lambda adapter, request, **kwargs: server.send(request)):
+            response = session.get('http://server/api/sample')
+            self.assertFalse(response.from_cache)
+            response = session.get('http://server/api/sample')
+            self.assertTrue(response.from_cache)
+            self.assertEqual(response.json(), {'count': 1})
+            self.assertEqual(server.requests[-1].headers['If-None-Match'], '"1"')
+
+            server.etag, server.body = '"2"', b'{"count": 2}'
+            response = session.get('http://server/api/sample')
+            self.assertFalse(response.from_cache)
+            self.assertEqual(response.json(), {'count': 2})
+        self.assertEqual(self.cache.info()['hits'], 1)
+        self.assertEqual(self.cache.info()['misses'], 2)
+
+    def test_lru_eviction(self):
+        for key in 'ab':
+            self.cache.set(key, '"1"', None, {}, b'x' * 40)
+        self.cache.touch('a')
+        self.cache.set('c', '"1"', None, {}, b'x' * 40)
+        self.assertIsNotNone(self.cache.get('a'))
+        self.assertIsNone(self.cache.get('b'))
+        self.assertIsNotNone(self.cache.get('c'))
+        self.assertEqual(self.cache.info()['evictions'], 1)
+        self.assertEqual(self.cache.info()['size'], 80)
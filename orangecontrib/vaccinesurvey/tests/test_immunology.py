@@ -0,0 +1,45 @@
+import unittest
+
+import numpy as np
+
+from orangecontrib.vaccinesurvey.immunology import ANTIGENS, to_long, to_wide
+from orangecontrib.vaccinesurvey.resolwe import to_orange_table
+
+
+def sample(study_code, **measurements):
+    descriptor = {'study_code': study_code, 'sex': 'F'}
+    if measurements:
+        descriptor['immunological_data'] = measurements
+    return {'descriptor': {'sample': descriptor}}
+
+
+class ImmunologyTests(unittest.TestCase):
+
+    def setUp(self):
+        self.table = to_orange_table([sample('A1', ama1=0.5, nanp=1.5), sample('A2'),
+                                      sample('A3', msp1=2.0, total_ige=0.0)])
+
+    def test_to_long(self):
+        long = to_long(self.table)
+        self.assertEqual(list(long.domain['antigen'].values), ANTIGENS)
+        self.assertEqual([(row['study_code'].value, str(row['antigen']), row['value']) for row in long],
+                         [('A1', 'ama1', 0.5), ('A1', 'nanp', 1.5), ('A3', 'msp1', 2.0), ('A3', 'total_ige', 0.0)])
+
+    def test_to_wide(self):
+        wide = to_wide(to_long(self.table))
+        self.assertEqual([var.name for var in wide.domain.attributes], ANTIGENS)
+        self.assertEqual(list(wide.get_column('study_code')), ['A1', 'A3'])
+        np.testing.assert_equal(wide.X, self.table[[0, 2]].transform(wide.domain).X)
+
+    def test_samples_with_same_metas(self):
+        table = to_orange_table([sample(None, ama1=1.0, msp1=2.0), sample('A2', ama1=3.0), sample(None, ama1=4.0)])
+        long = to_long(table)
+        self.assertEqual(list(long.get_column('sample')), [0, 0, 1, 2])
+        wide = to_wide(long)
+        self.assertEqual([var.name for var in wide.domain.metas], [var.name for var in table.domain.metas])
+        np.testing.assert_equal(wide.X, table.transform(wide.domain).X)
+
+    def test_empty(self):
+        long = to_long(to_orange_table([sample('A1')]))
+        self.assertEqual(len(long), 0)
+        self.assertEqual(len(to_wide(long)), 0)
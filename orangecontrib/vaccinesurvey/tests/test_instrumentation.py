@@ -0,0 +1,43 @@
+import json
+import os
+import tempfile
+import unittest
+
+from orangecontrib.vaccinesurvey.instrumentation import Stats, json_sink, format_summary
+
+
+class StatsTests(unittest.TestCase):
+
+    def test_summary(self):
+        stats = Stats()
+        with stats.span('fetch_page') as span:
+            span.rows, span.bytes = 10, 2 ** 20
+        stats.count('table_cache.hit')
+        mark = stats.mark()
+        for _ in range(2):
+            with stats.span('fetch_page') as span:
+                span.rows = 5
+        stats.count('table_cache.miss')
+
+        summary = stats.summary()
+        self.assertEqual(summary['spans']['fetch_page']['calls'], 3)
+        self.assertEqual(summary['spans']['fetch_page']['rows'], 20)
+        self.assertEqual(dict(summary['counters']), {'table_cache.hit': 1, 'table_cache.miss': 1})
+
+        summary = stats.summary(mark)
+        self.assertEqual(summary['spans']['fetch_page']['calls'], 2)
+        self.assertEqual(summary['spans']['fetch_page']['bytes'], 0)
+        self.assertEqual(dict(summary['counters']), {'table_cache.miss': 1})
+        self.assertIn('fetch_page:', format_summary(summary))
+        self.assertEqual(json.loads(stats.to_json(mark))['counters'], {'table_cache.miss': 1})
+
+    def test_json_sink(self):
+        stats = Stats()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'spans.jsonl')
+            stats.sinks.append(json_sink(path))
+            with stats.span('login'):
+                pass
+            with open(path) as f:
+                spans = [json.loads(line) for line in f]
+        self.assertEqual([span['name'] for span in spans], ['login'])
@@ -0,0 +1,85 @@
+import tempfile
+import threading
+from unittest import mock
+
+from Orange.widgets.tests.base import WidgetTest
+
+from orangecontrib.vaccinesurvey.resolwe import to_orange_table
+from orangecontrib.vaccinesurvey.tests.helpers import FakeResolweAPI, sample
+from orangecontrib.vaccinesurvey.widgets import owimportsamples
+from orangecontrib.vaccinesurvey.widgets.owimportsamples import OWImportSamples
+
+
+def table(*codes):
+    return to_orange_table([sample(i, study_code=code) for i, code in enumerate(codes)])
+
+
+class ImportSamplesTests(WidgetTest):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        for patcher in (mock.patch.object(owimportsamples.table_cache, 'path', self.tmp.name),
+                        mock.patch.object(owimportsamples.download, 'cache_path', self.tmp.name)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmp.cleanup)
+        self.widget = self.create_widget(OWImportSamples)
+        self.widget.res = FakeResolweAPI()
+        self.widget._url = 'http://localhost'
+
+    def download(self, *results):
+        """Start a download for each of `results` (tables or exceptions), released in order once all started."""
+        results = list(results)
+        started = threading.Event()
+
+        def download(*args):
+            started.wait(5)
+            result = results.pop(0)
+            if isinstance(result, Exception):
+                raise result
+            return 'v1', result, {}
+
+        with mock.patch.object(owimportsamples.download, 'download', download):
+            for _ in range(len(results)):
+                self.widget.start_download()
+            started.set()
+            self.process_events(until=lambda: not results and self.widget._datatask is None)
+
+    def test_superseded_download_ignored(self):
+        self.download(table('old'), table('new'))
+        data = self.get_output('Data')
+        self.assertEqual(list(data.get_column('study_code')), ['new'])
+        self.assertIsNone(self.widget._datatask)
+
+    def test_failed_download(self):
+        self.download(ValueError('unexpected response'))
+        self.assertIsNone(self.widget._datatask)
+        self.assertIsNone(self.get_output('Data'))
+        self.assertTrue(self.widget.servers.isEnabled())
+        self.assertIn('Error', self.widget.info.text())
+
+        # the next refresh checks the server again
+        self.widget.refresh()
+        self.assertIsNotNone(self.widget._checktask)
+
+    def test_federated_refresh_uses_cache(self):
+        servers = {'http://a': FakeResolweAPI([sample(1, study_code='A1')]),
+                   'http://b': FakeResolweAPI([sample(2, study_code='B1')])}
+        for url in servers:
+            self.widget.servers.addItem(url)
+            self.widget.credentials[url] = ['user', 'password']
+        self.widget.combo_items = list(servers)
+        self.widget.federated = True
+
+        with mock.patch.object(owimportsamples.sessions, 'get', lambda user, password, url, cache: servers[url]):
+            for _ in range(2):
+                self.widget.refresh()
+                self.process_events(until=lambda: not self.widget._sourcetasks)
+                self.assertEqual(sorted(self.get_output('Data').get_column('study_code')), ['A1', 'B1'])
+            self.assertEqual([res.downloads for res in servers.values()], [1, 1])
+
+            servers['http://b'].samples.append(sample(3, '2016-01-02T10:00:00', study_code='B2'))
+            self.widget.refresh()
+            self.process_events(until=lambda: not self.widget._sourcetasks)
+            self.assertEqual(sorted(self.get_output('Data').get_column('study_code')), ['A1', 'B1', 'B2'])
+            self.assertEqual([res.downloads for res in servers.values()], [1, 2])
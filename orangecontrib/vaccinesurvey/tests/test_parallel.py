@@ -0,0 +1,64 @@
+import unittest
+
+import numpy as np
+
+from orangecontrib.vaccinesurvey.parallel import to_orange_table_parallel, records_to_table_parallel
+from orangecontrib.vaccinesurvey.records import SampleRecord
+from orangecontrib.vaccinesurvey.resolwe import TableBuilder, sample_descriptor, to_orange_table, DATA, METAS
+from orangecontrib.vaccinesurvey.schema import Schema
+from orangecontrib.vaccinesurvey.tests.helpers import sample
+
+
+SAMPLES = [
+    sample(1, sex='M', village_code=8, entry_date='2016-01-01', study_code='A1', immunological_data={'ama1': 0.5}),
+    sample(2, sex='F', village_code=7, entry_date='2016-02-30', study_code='A2'),
+    sample(3, village_code=9, entry_date='2016-03-01 10:00', study_code='A3'),
+    sample(4, sex='F', village_code=7, study_code='A4'),
+    sample(5, sex='X', village_code=5, birth_date='2010-01-01', entry_date='2016-01-01'),
+]
+
+
+class ParallelTests(unittest.TestCase):
+
+    def assertTablesEqual(self, table, expected):
+        self.assertEqual([(var.name, getattr(var, 'values', None)) for var in table.domain.variables],
+                         [(var.name, getattr(var, 'values', None)) for var in expected.domain.variables])
+        self.assertEqual([var.name for var in table.domain.metas], [var.name for var in expected.domain.metas])
+        np.testing.assert_array_equal(table.X, expected.X)
+        self.assertEqual(table.metas.tolist(), expected.metas.tolist())
+
+    def test_same_as_serial(self):
+        for processes in (1, 2, 3, 8):
+            table, malformed = to_orange_table_parallel(SAMPLES, processes)
+            self.assertTablesEqual(table, to_orange_table(SAMPLES))
+            self.assertEqual(malformed['entry_date'], 1)
+            self.assertTrue(table.domain['entry_date'].have_time)
+
+    def test_known_values(self):
+        values = {'sex': ['M', 'Z']}
+        table, _ = to_orange_table_parallel(SAMPLES, 2, values=values)
+        builder = TableBuilder(values=values)
+        builder.extend(sample_descriptor(sample) for sample in SAMPLES)
+        self.assertTablesEqual(table, builder.table())
+        self.assertEqual(table.domain['sex'].values, ('M', 'Z', 'F', 'X'))
+
+    def test_records(self):
+        table, malformed = records_to_table_parallel([SampleRecord.from_sample(sample) for sample in SAMPLES], 2)
+        self.assertTablesEqual(table, to_orange_table(SAMPLES))
+        self.assertEqual(malformed['entry_date'], 1)
+
+    def test_schema_not_registered(self):
+        # Workers do not know schemas from servers, which are registered in the parent only
+        schema = Schema('sample', DATA, METAS, version='9.9.9')
+        table, _ = to_orange_table_parallel(SAMPLES, 2, schema)
+        builder = TableBuilder(schema=schema)
+        builder.extend(sample_descriptor(sample) for sample in SAMPLES)
+        self.assertTablesEqual(table, builder.table())
+
+    def test_empty(self):
+        table, _ = to_orange_table_parallel([], 2)
+        self.assertEqual(len(table), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import unittest
+
+from orangecontrib.vaccinesurvey.records import SampleRecord
+from orangecontrib.vaccinesurvey.resolwe import TableBuilder, match_filters, to_orange_table
+from orangecontrib.vaccinesurvey.tests.helpers import sample
+
+
+SAMPLES = [
+    sample(1, sex='F', village_code=7, entry_date='2016-01-01', study_code='A1',
+           location={'latitude': 1.5, 'longitude': 2.5}, immunological_data={'ama1': 0.5}),
+    sample(2, sex='M', village_code=8, study_code='A2'),
+]
+
+
+class SampleRecordTests(unittest.TestCase):
+
+    def test_from_sample(self):
+        record = SampleRecord.from_sample(SAMPLES[0])
+        self.assertEqual((record.id, record.modified), (1, '2016-01-01T10:00:00'))
+        self.assertEqual(record.get('latitude'), 1.5)
+        self.assertEqual(record.get('study_code'), 'A1')
+        self.assertIsNone(record.get('msp1'))
+        self.assertIsNone(record.get('unknown'))
+        self.assertFalse(hasattr(record, '__dict__'))
+        self.assertEqual(record.to_json(), SAMPLES[0])
+
+    def test_interned(self):
+        a, b = [SampleRecord.from_sample(sample(i, sex=''.join(['F']))) for i in range(2)]
+        self.assertIs(a.get('sex'), b.get('sex'))
+
+    def test_match_filters(self):
+        record = SampleRecord.from_sample(SAMPLES[0])
+        self.assertTrue(match_filters(record, {'village_code': '7', 'entry_date_from': '2016-01-01'}))
+        self.assertFalse(match_filters(record, {'study_code': 'A2'}))
+
+    def test_table(self):
+        builder = TableBuilder(1)
+        builder.extend_records(SampleRecord.from_sample(s) for s in SAMPLES)
+        table, expected = builder.table(), to_orange_table(SAMPLES)
+        self.assertEqual(table.domain, expected.domain)
+        self.assertEqual(str(table), str(expected))
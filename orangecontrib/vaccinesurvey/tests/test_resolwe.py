@@ -1,6 +1,28 @@
+import json
+import threading
 import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import numpy as np
+import requests
 
 from orangecontrib.vaccinesurvey import ResolweAPI
+from orangecontrib.vaccinesurvey.resolwe import to_orange_table, descriptor_fields, match_filters, \
+    TableBuilder, discrete_values
+
+
+class Sample(object):
+    def __init__(self, descriptor):
+        self.descriptor = {'sample': descriptor}
+
+
+SAMPLES = [
+    Sample({'study_code': 'S1', 'sex': 'F', 'village_code': 'V1', 'body_temp': 37.5,
+            'entry_date': '2015-03-02', 'location': {'latitude': 1.5, 'longitude': 33.0},
+            'immunological_data': {'ama1': 0.5, 'msp1': 1, 'msp2': 2, 'nanp': 3, 'total_ige': 4}}),
+    Sample({'study_code': 'S2', 'sex': 'M', 'village_code': 'V1'}),
+]
 
 
 class ResolweTests(unittest.TestCase):
@@ -10,3 +32,139 @@ class ResolweTests(unittest.TestCase):
         password = 'admin'
         url = 'http://127.0.0.1:8001'
         self.assertTrue(ResolweAPI(username, password, url))
+
+
+class ToOrangeTableTests(unittest.TestCase):
+
+    def test_to_orange_table(self):
+        table = to_orange_table(SAMPLES)
+        self.assertEqual(len(table), 2)
+        self.assertEqual(table.domain['sex'].values, ('F', 'M'))
+        self.assertEqual(table.domain['village_code'].values, ('V1',))
+        self.assertEqual(table[0]['body_temp'], 37.5)
+        self.assertEqual(table[0]['ama1'], 0.5)
+        self.assertTrue(np.isnan(table[1]['ama1']))
+        self.assertTrue(np.isnan(table[1]['entry_date']))
+        self.assertEqual(list(table.metas[:, 0]), ['S1', 'S2'])
+
+    def test_stable_values(self):
+        builder = TableBuilder()
+        builder.extend([{'village_code': 'V3'}, {'village_code': 'V1'}, {}])
+        table = builder.table()
+        self.assertEqual(table.domain['village_code'].values, ('V1', 'V3'))
+        self.assertEqual(list(table.X[:2, 3]), [1, 0])
+
+        builder = TableBuilder(values=discrete_values(table.domain))
+        builder.extend([{'village_code': 'V2'}, {'village_code': 'V0'}, {'village_code': 'V3'}])
+        reloaded = builder.table()
+        self.assertEqual(reloaded.domain['village_code'].values, ('V1', 'V3', 'V0', 'V2'))
+        self.assertEqual(list(reloaded.X[:, 3]), [3, 2, 1])
+
+        builder = TableBuilder(values=discrete_values(table.domain))
+        builder.extend([{'village_code': 'V1'}, {}])
+        self.assertEqual(builder.table().domain, table.domain)
+
+    def test_match_filters(self):
+        descriptor = SAMPLES[0].descriptor['sample']
+        self.assertTrue(match_filters(descriptor, {'village_code': 'V1', 'study_code': ''}))
+        self.assertFalse(match_filters(descriptor, {'village_code': 'V2'}))
+        self.assertTrue(match_filters(descriptor, {'entry_date_from': '2015-03-02', 'entry_date_to': '2015-03-02'}))
+        self.assertFalse(match_filters(descriptor, {'entry_date_from': '2015-03-03'}))
+        self.assertFalse(match_filters(SAMPLES[1].descriptor['sample'], {'entry_date_to': '2015-03-03'}))
+
+    def test_grow(self):
+        table = to_orange_table(iter(SAMPLES * 1500))
+        self.assertEqual(len(table), 3000)
+        self.assertEqual(table[2999]['sex'], 'M')
+
+
+class FakeResponse(object):
+    def __init__(self, status_code, content=None):
+        self.status_code = status_code
+        self.content = json.dumps(content).encode('utf-8')
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(response=self)
+
+    def json(self):
+        return json.loads(self.content.decode('utf-8'))
+
+
+class FakeSession(object):
+    """Serve `count` samples in pages of at most `max_limit`, failing the first request of each offset once."""
+
+    def __init__(self, count, max_limit=7):
+        self.count = count
+        self.max_limit = max_limit
+        self.failed = set()
+        self.lock = threading.Lock()
+
+    def get(self, url, params, **kwargs):
+        self.params = params
+        offset, limit = params.get('offset', 0), min(params['limit'], self.max_limit)
+        with self.lock:
+            if offset not in self.failed:
+                self.failed.add(offset)
+                return FakeResponse(503)
+        results = [{'id': i, 'modified': '2016-01-{:02d}'.format(i + 1)}
+                   for i in range(offset, min(offset + limit, self.count))]
+        return FakeResponse(200, {'count': self.count, 'next': offset + limit < self.count or None,
+                                  'results': results})
+
+
+def fake_api(session):
+    res = ResolweAPI.__new__(ResolweAPI)
+    res._res = SimpleNamespace(url='http://127.0.0.1:8001')
+    res._session = session
+    return res
+
+
+@patch('orangecontrib.vaccinesurvey.resolwe.BACKOFF', 0)
+class SamplePagesTests(unittest.TestCase):
+
+    def test_pages_in_order(self):
+        for workers in (1, 4):
+            res = fake_api(FakeSession(100))
+            pages = list(res.get_sample_pages(page_size=10, workers=workers))
+            self.assertEqual([s['id'] for page in pages for s in page['results']], list(range(100)))
+
+    def test_projection_and_filters(self):
+        session = FakeSession(5)
+        list(fake_api(session).get_sample_pages(filters={'village_code': 'V1', 'study_code': ''}))
+        self.assertEqual(session.params['descriptor__sample__village_code'], 'V1')
+        self.assertNotIn('descriptor__sample__study_code', session.params)
+        fields = session.params['fields'].split(',')
+        self.assertEqual(fields, descriptor_fields())
+        self.assertIn('descriptor__sample__immunological_data__ama1', fields)
+        self.assertIn('descriptor__sample__study_code', fields)
+
+        list(fake_api(session).get_sample_pages(ids=[3, 5]))
+        self.assertEqual(session.params['id__in'], '3,5')
+
+    def test_data_version(self):
+        session = FakeSession(5)
+        self.assertEqual(fake_api(session).get_data_version({'village_code': 'V1'}), '5:2016-01-01')
+        self.assertEqual(session.params['limit'], 1)
+        self.assertEqual(session.params['ordering'], '-modified')
+        self.assertEqual(session.params['descriptor__sample__village_code'], 'V1')
+
+    def test_client_error(self):
+        session = FakeSession(10)
+        session.get = lambda url, params, **kwargs: FakeResponse(403)
+        with self.assertRaises(requests.exceptions.HTTPError):
+            list(fake_api(session).get_sample_pages())
+
+    def test_cancel(self):
+        cancelled = threading.Event()
+        pages = fake_api(FakeSession(100)).get_sample_pages(page_size=10, workers=2, cancelled=cancelled)
+        next(pages)
+        cancelled.set()
+        self.assertEqual(list(pages), [])
+
+    def test_cancel_first_page(self):
+        cancelled = threading.Event()
+        cancelled.set()
+        session = FakeSession(100)
+        self.assertEqual(list(fake_api(session).get_sample_pages(cancelled=cancelled)), [])
+        self.assertEqual(session.failed, set())
@@ -0,0 +1,161 @@
+import os
+import tempfile
+import threading
+import unittest
+
+from Orange.data import ContinuousVariable, DiscreteVariable, StringVariable, TimeVariable
+
+from orangecontrib.vaccinesurvey.resolwe import TableBuilder, descriptor_fields
+from orangecontrib.vaccinesurvey.schema import register_schema, get_schema, schema_from_definitions, \
+    SchemaRegistry, SCHEMAS
+
+
+def definition(id_, version, *fields):
+    return {'id': id_, 'slug': 'sample-test', 'version': version,
+            'schema': [{'name': 'sample', 'group': list(fields)}]}
+
+
+DEFINITIONS = [
+    definition(1, '1.0.0',
+               {'name': 'sex', 'type': 'basic:string:', 'choices': [{'value': 'M'}, {'value': 'F'}]},
+               {'name': 'weight', 'type': 'basic:decimal:'},
+               {'name': 'code', 'type': 'basic:string:'}),
+    definition(2, '1.10.0',
+               {'name': 'sex', 'type': 'basic:string:', 'choices': [{'value': 'M'}, {'value': 'F'}]},
+               {'name': 'body', 'group': [{'name': 'weight', 'type': 'basic:decimal:'},
+                                          {'name': 'height', 'type': 'basic:integer:'}]},
+               {'name': 'visit', 'type': 'basic:datetime:'},
+               {'name': 'code', 'type': 'basic:string:'},
+               {'name': 'photo', 'type': 'basic:file:'}),
+]
+
+
+class FakeResolweAPI(object):
+    url = 'http://server'
+
+    def __init__(self, definitions):
+        self.definitions = definitions
+        self.requests = []
+
+    def get_descriptor_schemas(self, slug, fields=None):
+        self.requests.append(fields)
+        if fields:
+            return [{key: d[key] for key in fields.split(',')} for d in self.definitions]
+        return self.definitions
+
+
+class SchemaTests(unittest.TestCase):
+
+    def setUp(self):
+        self.schema = register_schema('sample-test', [
+            ['sex', {'type': DiscreteVariable}],
+            ['visit', {'type': TimeVariable}],
+            ['weight', {'type': ContinuousVariable, 'group': 'body'}],
+        ], [['code', {'type': StringVariable}]])
+
+    def tearDown(self):
+        del SCHEMAS['sample-test']
+
+    def test_parse(self):
+        self.assertIs(get_schema('sample-test'), self.schema)
+        self.assertEqual(self.schema.parse({'sex': 1, 'visit': '2016-01-01', 'body': {'weight': 60}, 'code': 'A'}),
+                         ['1', '2016-01-01', 60, 'A'])
+        self.assertEqual(self.schema.parse({'sex': True, 'body': {}}), [True, None, None, None])
+
+    def test_table_builder(self):
+        builder = TableBuilder(schema='sample-test')
+        builder.extend([{'sex': 'F', 'body': {'weight': 60}, 'code': 'A'}, {'sex': 'M'}])
+        table = builder.table()
+        self.assertEqual([var.name for var in table.domain.attributes], ['sex', 'visit', 'weight'])
+        self.assertEqual(table.domain['sex'].values, ('F', 'M'))
+        self.assertEqual(table[0]['weight'], 60)
+
+
+class DefinitionsTests(unittest.TestCase):
+
+    def tearDown(self):
+        for key in [key for key in SCHEMAS if key.startswith('sample-test')]:
+            del SCHEMAS[key]
+
+    def test_columns(self):
+        schema = schema_from_definitions('sample-test', DEFINITIONS)
+        self.assertEqual(schema.key, 'sample-test@1.0.0+1.10.0')
+        self.assertIs(get_schema(schema.key), schema)
+        self.assertEqual([(var[0], var[1]['type']) for var in schema.data],
+                         [('sex', DiscreteVariable), ('weight', ContinuousVariable), ('height', ContinuousVariable),
+                          ('visit', TimeVariable)])
+        self.assertEqual([var[0] for var in schema.metas], ['code'])
+        self.assertEqual(schema.data[0][1]['values'], ['M', 'F'])
+        self.assertEqual([(var[0], var[1].get('group'), var[1].get('other_groups')) for var in schema.data],
+                         [('sex', None, None), ('weight', 'body', [None]), ('height', 'body', None),
+                          ('visit', None, None)])
+        self.assertIn('descriptor__sample__body__weight', descriptor_fields(schema))
+        self.assertIn('descriptor__sample__weight', descriptor_fields(schema))
+
+    def test_defaults(self):
+        defaults = register_schema('sample-test', [['code', {'type': DiscreteVariable}],
+                                                   ['visit', {'type': TimeVariable}],
+                                                   ['removed', {'type': ContinuousVariable}]])
+        schema = schema_from_definitions('sample-test', DEFINITIONS, defaults)
+        self.assertEqual([var[0] for var in schema.data], ['code', 'visit', 'sex', 'weight', 'height'])
+        self.assertEqual(schema.metas, [])
+
+    def test_versions_in_one_table(self):
+        schema = schema_from_definitions('sample-test', DEFINITIONS)
+        builder = TableBuilder(schema=schema)
+        builder.extend([{'sex': 'F', 'weight': 60, 'code': 'A'},
+                        {'sex': 'M', 'body': {'weight': 70, 'height': 180}, 'visit': '2016-01-01 10:00', 'code': 'B'}])
+        table = builder.table()
+        self.assertEqual(table.domain['sex'].values, ('M', 'F'))
+        self.assertEqual(list(table.get_column('weight')), [60, 70])
+        self.assertEqual(table.metas[:, 0].tolist(), ['A', 'B'])
+
+
+class SchemaRegistryTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'schemas.json')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+        for key in [key for key in SCHEMAS if key.startswith('sample-test')]:
+            del SCHEMAS[key]
+
+    def test_get(self):
+        res = FakeResolweAPI(DEFINITIONS[:1])
+        registry = SchemaRegistry(self.path)
+        schema = registry.get(res, 'sample-test')
+        self.assertEqual(schema.version, '1.0.0')
+        self.assertIs(registry.get(res, 'sample-test'), schema)
+        self.assertEqual(res.requests, ['id,version', None, 'id,version'])
+
+        # Definitions are stored, so they are not retrieved again for unchanged versions
+        res.requests = []
+        self.assertEqual(SchemaRegistry(self.path).get(res, 'sample-test').key, schema.key)
+        self.assertEqual(res.requests, ['id,version'])
+
+        res.definitions = DEFINITIONS
+        self.assertEqual(registry.get(res, 'sample-test').version, '1.0.0+1.10.0')
+        self.assertEqual(registry.latest(res.url, 'sample-test').version, '1.0.0+1.10.0')
+
+    def test_concurrent_servers(self):
+        registry = SchemaRegistry(self.path)
+        servers = [FakeResolweAPI(DEFINITIONS[:1]) for _ in range(8)]
+        threads = []
+        for i, res in enumerate(servers):
+            res.url = 'http://server{}'.format(i)
+            threads.append(threading.Thread(target=registry.get, args=(res, 'sample-test')))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for res in servers:
+            self.assertEqual(SchemaRegistry(self.path).latest(res.url, 'sample-test').version, '1.0.0')
+        self.assertEqual(os.listdir(self.tmp.name), ['schemas.json'])
+
+    def test_defaults(self):
+        defaults = get_schema('sample-vaccinesurvey')
+        registry = SchemaRegistry(self.path)
+        self.assertIs(registry.get(FakeResolweAPI([]), 'sample-test', defaults), defaults)
+        self.assertIs(registry.latest('http://other', 'sample-test', defaults), defaults)
@@ -0,0 +1,32 @@
+import unittest
+from unittest.mock import patch
+
+from orangecontrib.vaccinesurvey.session import SessionManager
+
+
+class FakeResolweAPI(object):
+    def __init__(self, user, password, url, http_cache=None):
+        self.user, self.url = user, url
+
+
+@patch('orangecontrib.vaccinesurvey.session.ResolweAPI', FakeResolweAPI)
+class SessionManagerTests(unittest.TestCase):
+
+    def test_reuse(self):
+        sessions = SessionManager()
+        res = sessions.get('admin', 'admin', 'http://a')
+        self.assertIs(sessions.get('admin', 'admin', 'http://a'), res)
+        self.assertIsNot(sessions.get('admin', 'other', 'http://a'), res)
+        self.assertIsNot(sessions.get('admin', 'admin', 'http://b'), res)
+        self.assertIsNot(sessions.get('other', 'admin', 'http://a'), res)
+
+    def test_expire(self):
+        sessions = SessionManager(max_age=0)
+        res = sessions.get('admin', 'admin', 'http://a')
+        self.assertIsNot(sessions.get('admin', 'admin', 'http://a'), res)
+
+    def test_invalidate(self):
+        sessions = SessionManager()
+        res = sessions.get('admin', 'admin', 'http://a')
+        sessions.invalidate('http://a', 'admin')
+        self.assertIsNot(sessions.get('admin', 'admin', 'http://a'), res)
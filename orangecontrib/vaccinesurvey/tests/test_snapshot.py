@@ -0,0 +1,74 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+import zipfile
+
+import numpy as np
+
+from orangecontrib.vaccinesurvey.federation import merge_tables
+from orangecontrib.vaccinesurvey.resolwe import to_orange_table
+from orangecontrib.vaccinesurvey.snapshot import save_snapshot, load_snapshot, _map_array, ALIGNMENT
+
+
+def sample(study_code, village_code, entry_date=None, ama1=None):
+    descriptor = {'study_code': study_code, 'village_code': village_code, 'entry_date': entry_date}
+    if ama1 is not None:
+        descriptor['immunological_data'] = {'ama1': ama1}
+    return {'descriptor': {'sample': descriptor}}
+
+
+class SnapshotTests(unittest.TestCase):
+
+    def setUp(self):
+        self.table = merge_tables([('http://a', to_orange_table([
+            sample('A1', 'V2', '2016-01-01T10:30:00', 0.5), sample(None, 'V1')]))])
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'cohort.vss')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_save_load(self):
+        save_snapshot(self.path, self.table, url='http://a', version='2:2016-01-01')
+        for mmap in (True, False):
+            table, info = load_snapshot(self.path, mmap=mmap)
+            self.assertEqual(info, {'url': 'http://a', 'version': '2:2016-01-01'})
+            self.assertEqual(table.domain, self.table.domain)
+            self.assertTrue(table.domain['entry_date'].have_time)
+            self.assertEqual(list(table.domain['village_code'].values), ['V1', 'V2'])
+            np.testing.assert_equal(table.X, self.table.X)
+            self.assertEqual(table.metas.tolist(), self.table.metas.tolist())
+
+    def test_mmap(self):
+        save_snapshot(self.path, self.table)
+        with zipfile.ZipFile(self.path) as archive:
+            X = _map_array(self.path, archive, 'X.npy')
+        self.assertIsInstance(X, np.memmap)
+        self.assertEqual(X.offset % ALIGNMENT, 0)
+        np.testing.assert_equal(X, self.table.X)
+
+    def test_empty(self):
+        save_snapshot(self.path, self.table[:0])
+        table, info = load_snapshot(self.path)
+        self.assertEqual(len(table), 0)
+        self.assertEqual(info, {})
+
+    def test_not_snapshot(self):
+        with open(self.path, 'w') as f:
+            f.write('study_code\n')
+        with self.assertRaises(ValueError):
+            load_snapshot(self.path)
+
+    def test_compress(self):
+        save_snapshot(self.path, self.table, compress=True)
+        table, _ = load_snapshot(self.path)
+        np.testing.assert_equal(table.X, self.table.X)
+
+    def test_failed_save(self):
+        save_snapshot(self.path, self.table, version='1')
+        with mock.patch('orangecontrib.vaccinesurvey.snapshot._write_array', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                save_snapshot(self.path, self.table, version='2')
+        self.assertEqual(os.listdir(self.tmp.name), ['cohort.vss'])
+        self.assertEqual(load_snapshot(self.path)[1], {'version': '1'})
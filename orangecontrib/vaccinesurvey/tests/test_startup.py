@@ -0,0 +1,36 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+#  imports the widget module after Orange, which the canvas has already loaded,
+#  and reports the add-on's own share of the import time
+SCRIPT = """
+import json, os, sys, time
+import Orange.data, Orange.widgets.widget, Orange.widgets.gui
+start = time.perf_counter()
+import orangecontrib.vaccinesurvey.widgets.owimportsamples
+print(json.dumps({
+    'seconds': time.perf_counter() - start,
+    'modules': [name for name in ('resdk', 'boto3') if name in sys.modules],
+    'cache': os.path.exists(os.path.join(os.environ['XDG_CACHE_HOME'], 'Orange')),
+}))
+"""
+
+#  generous upper bound for importing the add-on; loading resdk alone took longer
+MAX_SECONDS = 2
+
+
+class StartupTests(unittest.TestCase):
+
+    def test_import_is_lazy(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, QT_QPA_PLATFORM='offscreen', XDG_CACHE_HOME=tmp)
+            output = subprocess.check_output([sys.executable, '-W', 'ignore', '-c', SCRIPT], env=env)
+        result = json.loads(output.decode('utf-8').splitlines()[-1])
+        self.assertEqual(result['modules'], [])
+        self.assertFalse(result['cache'])
+        self.assertLess(result['seconds'], MAX_SECONDS)
+
@@ -0,0 +1,67 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+from orangecontrib.vaccinesurvey.sync import SampleSnapshot
+from orangecontrib.vaccinesurvey.tests.helpers import FakeResolweAPI, sample
+
+
+class SampleSnapshotTests(unittest.TestCase):
+
+    def test_sync(self):
+        res = FakeResolweAPI([sample(1, '2016-01-01T10:00:00', sex='F'), sample(2, '2016-01-02T10:00:00', sex='F')])
+        snapshot = SampleSnapshot()
+        self.assertEqual(snapshot.sync(res, page_size=1), (2, 0))
+        self.assertEqual(snapshot.watermark, '2016-01-02T10:00:00')
+
+        res.samples = [sample(2, '2016-01-02T10:00:00', sex='F'), sample(3, '2016-01-03T10:00:00', sex='M')]
+        self.assertEqual(snapshot.sync(res, page_size=1), (2, 1))
+        self.assertEqual(res.requested, [None, '2016-01-02T10:00:00'])
+        self.assertEqual([s['id'] for s in snapshot.to_list()], [2, 3])
+        self.assertEqual(snapshot.watermark, '2016-01-03T10:00:00')
+
+    def test_sync_missing(self):
+        res = FakeResolweAPI([sample(1, '2016-01-01T10:00:00', sex='F'), sample(3, '2016-01-03T10:00:00', sex='F')])
+        snapshot = SampleSnapshot()
+        snapshot.sync(res)
+        # A sample older than the watermark that was not visible at the last sync
+        res.samples.append(sample(2, '2016-01-02T10:00:00', sex='M'))
+        self.assertEqual(snapshot.sync(res, page_size=1), (2, 0))
+        self.assertEqual(res.requested[1:], ['2016-01-03T10:00:00', [2]])
+        self.assertEqual([s['id'] for s in snapshot.to_list()], [1, 2, 3])
+        self.assertEqual(snapshot.watermark, '2016-01-03T10:00:00')
+
+    def test_save_load(self):
+        snapshot = SampleSnapshot()
+        snapshot.merge([sample(5, '2016-01-01T10:00:00', sex='F')])
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'snapshot.json')
+            self.assertEqual(len(SampleSnapshot.load(path)), 0)
+            snapshot.save(path)
+            loaded = SampleSnapshot.load(path)
+            other = SampleSnapshot.load(path, schema='sample-vaccinesurvey@2.0.0')
+        self.assertEqual(loaded.to_list(), snapshot.to_list())
+        self.assertEqual(loaded.watermark, snapshot.watermark)
+        # Records of another schema are not loaded
+        self.assertEqual((len(other), other.watermark, other.schema), (0, None, 'sample-vaccinesurvey@2.0.0'))
+
+    def test_load_samples(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'snapshot.json')
+            with open(path, 'w') as f:
+                json.dump({'watermark': '2016-01-02T10:00:00', 'samples': [sample(5, '2016-01-01T10:00:00', sex='F')]}, f)
+            loaded = SampleSnapshot.load(path)
+        self.assertEqual(loaded.to_list(), [sample(5, '2016-01-01T10:00:00', sex='F')])
+        self.assertEqual(loaded.watermark, '2016-01-02T10:00:00')
+
+    def test_sync_cancelled(self):
+        res = FakeResolweAPI([sample(1, '2016-01-01T10:00:00', sex='F')])
+        snapshot = SampleSnapshot()
+        snapshot.sync(res)
+        res.samples = []
+        cancelled = threading.Event()
+        cancelled.set()
+        self.assertEqual(snapshot.sync(res, cancelled=cancelled), (0, 0))
+        self.assertEqual(len(snapshot), 1)
@@ -0,0 +1,59 @@
+import unittest
+
+import numpy as np
+
+from orangecontrib.vaccinesurvey.resolwe import to_orange_table
+from orangecontrib.vaccinesurvey.validation import validate, format_report, REPORT
+from orangecontrib.vaccinesurvey.tests.helpers import sample
+
+
+SAMPLES = [
+    sample(1, study_code='A1', body_temp=37, entry_date='2016-01-01', birth_date='2010-01-01',
+           location={'latitude': 1.5, 'longitude': 2.5}),
+    sample(2, study_code='A2', body_temp=73, immunological_data={'ama1': -1}),
+    sample(3, study_code='A1', entry_date='2016-01-01', birth_date='2017-01-01', location={'latitude': 91}),
+    sample(4, entry_date='2030-01-01'),
+    sample(5),
+]
+NOW = 1577836800  # 2020-01-01
+
+
+class ValidationTests(unittest.TestCase):
+
+    def test_flags(self):
+        table, report = validate(to_orange_table(SAMPLES), NOW)
+
+        def flagged(name):
+            return list(np.flatnonzero(table.get_column(name)))
+
+        self.assertEqual(flagged('body_temp out of range'), [1])
+        self.assertEqual(flagged('ama1 out of range'), [1])
+        self.assertEqual(flagged('latitude out of range'), [2])
+        self.assertEqual(flagged('longitude out of range'), [])
+        self.assertEqual(flagged('age_at_entry out of range'), [2])
+        self.assertEqual(flagged('birth after entry'), [2])
+        self.assertEqual(flagged('entry in future'), [3])
+        self.assertEqual(flagged('duplicate study_code'), [0, 2])
+        self.assertEqual(table.domain['duplicate study_code'].values, ('no', 'yes'))
+        self.assertEqual(report['duplicate study_code'], 2)
+        self.assertEqual(table.attributes[REPORT], report)
+        self.assertEqual(list(table.get_column('study_code')), ['A1', 'A2', 'A1', '', ''])
+        np.testing.assert_array_equal(table.X, to_orange_table(SAMPLES).X)
+
+    def test_revalidate(self):
+        table, _ = validate(to_orange_table(SAMPLES), NOW)
+        again, report = validate(table, NOW)
+        self.assertEqual([var.name for var in again.domain.metas], [var.name for var in table.domain.metas])
+        self.assertEqual(format_report(report), 'body_temp out of range (1), latitude out of range (1), '
+                                                'age_at_entry out of range (1), ama1 out of range (1), '
+                                                'birth after entry (1), entry in future (1), '
+                                                'duplicate study_code (2)')
+
+    def test_valid(self):
+        table, report = validate(to_orange_table(SAMPLES[:1]), NOW)
+        self.assertEqual(format_report(report), '')
+        self.assertEqual(len(table.domain.metas), 1 + len(report))
+
+
+if __name__ == '__main__':
+    unittest.main()
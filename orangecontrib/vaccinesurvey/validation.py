@@ -0,0 +1,108 @@
+"""Data-quality checks of converted samples
+
+Checks run on whole columns of the converted table, so they take a small
+fraction of the time of the conversion. Each check adds a meta column that
+flags the rows that fail it and the numbers of flagged rows are reported.
+"""
+import time
+from collections import OrderedDict
+
+import numpy as np
+from Orange.data import DiscreteVariable, Domain, Table
+
+from .immunology import ANTIGENS
+from .instrumentation import stats
+from .resolwe import AGE_AT_ENTRY
+
+# Valid ranges (limits included, None for no limit) of numeric columns
+RANGES = OrderedDict([
+    ('body_temp', (30, 45)),
+    ('latitude', (-90, 90)),
+    ('longitude', (-180, 180)),
+    (AGE_AT_ENTRY, (0, 120)),
+] + [(antigen, (0, None)) for antigen in ANTIGENS])
+# Column with codes that should be unique
+KEY = 'study_code'
+# Values of flag columns
+FLAG_VALUES = ('no', 'yes')
+# Key of the report in table's attributes
+REPORT = 'validation'
+
+
+def _column(table, name):
+    return table.get_column(name).astype(float)
+
+
+def check(table, now=None):
+    """Return flags (boolean arrays) of rows of `table` that fail the checks by the name of the check.
+
+    Only checks of columns in the table are done: ranges (RANGES), birth after
+    entry, entry after `now` (a timestamp, the current time by default) and
+    duplicated codes (KEY) of samples.
+    """
+    names = {var.name for var in table.domain.variables + table.domain.metas}
+    flags = OrderedDict()
+    for name, (low, high) in RANGES.items():
+        if name in names:
+            column = _column(table, name)
+            flag = np.zeros(len(column), dtype=bool)
+            if low is not None:
+                flag |= column < low
+            if high is not None:
+                flag |= column > high
+            flags['{} out of range'.format(name)] = flag
+    if 'birth_date' in names and 'entry_date' in names:
+        flags['birth after entry'] = _column(table, 'birth_date') > _column(table, 'entry_date')
+    if 'entry_date' in names:
+        flags['entry in future'] = _column(table, 'entry_date') > (time.time() if now is None else now)
+    if KEY in names:
+        flags['duplicate {}'.format(KEY)] = _duplicates(table.get_column(KEY))
+    return flags
+
+
+def _duplicates(codes):
+    """Return flags of defined codes (strings) that appear more than once."""
+    codes = np.asarray(codes, dtype=object)
+    defined = (codes == codes) & np.not_equal(codes, None) & (codes != '')
+    codes = np.where(defined, codes, '')
+    # Equal codes are adjacent once sorted
+    order = np.argsort(codes, kind='stable')
+    ordered = codes[order]
+    same = ordered[1:] == ordered[:-1]
+    duplicate = np.zeros(len(codes), dtype=bool)
+    duplicate[1:] |= same
+    duplicate[:-1] |= same
+    flags = np.empty(len(codes), dtype=bool)
+    flags[order] = duplicate
+    return flags & defined
+
+
+def validate(table, now=None):
+    """Return `table` with a meta column of flags for each check (see `check`) and the report.
+
+    The report, numbers of flagged rows by check, is also stored in
+    `table.attributes['validation']`. Flag columns of earlier validation are
+    replaced.
+    """
+    with stats.span('validate') as span:
+        span.rows = len(table)
+        flags = check(table, now)
+        keep = [i for i, var in enumerate(table.domain.metas) if var.name not in flags]
+        metas = [table.domain.metas[i] for i in keep] + [DiscreteVariable(name, values=FLAG_VALUES) for name in flags]
+        domain = Domain(table.domain.attributes, table.domain.class_vars, metas)
+        # Columns are assigned into an object array, with flags referring to the same two floats
+        M = np.empty((len(table), len(metas)), dtype=object)
+        M[:, :len(keep)] = table.metas[:, keep]
+        codes = np.array([0.0, 1.0], dtype=object)
+        for j, flag in enumerate(flags.values(), start=len(keep)):
+            M[:, j] = codes[flag.view(np.int8)]
+        validated = Table.from_numpy(domain, table.X, table.Y, M)
+        validated.attributes = dict(table.attributes)
+        report = OrderedDict((name, int(flag.sum())) for name, flag in flags.items())
+        validated.attributes[REPORT] = report
+        return validated, report
+
+
+def format_report(report):
+    """Return description of failed checks in report (see `validate`), or an empty string if there are none."""
+    return ', '.join('{} ({})'.format(name, n) for name, n in report.items() if n)
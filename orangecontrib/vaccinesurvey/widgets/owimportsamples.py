@@ -1,31 +1,39 @@
 """Import samples widget"""
-import requests
 import os
-import requests_cache
-
-from AnyQt.QtWidgets import QLineEdit
+import time
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from functools import partial
+
+from AnyQt.QtWidgets import QLineEdit, QFileDialog
 from AnyQt.QtWidgets import QSizePolicy as Policy
-from AnyQt.QtCore import pyqtSignal
+from AnyQt.QtCore import pyqtSignal, QTimer
 
-from Orange.misc import environ
 from Orange.data import Table
 from Orange.widgets.widget import OWWidget
 from Orange.widgets import gui, settings
 from Orange.widgets.utils.concurrent import ThreadExecutor, Task
-from ..resolwe import ResolweAPI, to_orange_table, ResolweCredentialsException, ResolweServerException
+from ..resolwe import discrete_values, \
+    ResolweCredentialsException, ResolweServerException, PAGE_SIZE, MAX_WORKERS, FILTERS
+from .. import download
+from ..download import table_cache, get_http_cache, snapshot_file, latest_schema
+from ..federation import merge_tables
+from ..immunology import to_long
+from ..snapshot import save_snapshot, load_snapshot, EXTENSION
+from ..validation import format_report, REPORT
+from ..cache import content_hash
+from ..instrumentation import stats, format_summary
+from ..session import sessions
 
 error_red = 'QWidget { background-color:#FFCCCC;}'
 
 
-#  Support cache with requests_cache module
-cache_path = os.path.join(environ.cache_dir(), "resolwe")
-try:
-    os.makedirs(cache_path)
-except OSError:
-    pass
-cache_file = os.path.join(cache_path, 'vaccinesurvey_cache')
-#  cache successful requests for one hour
-requests_cache.install_cache(cache_name=cache_file, backend='sqlite', expire_after=3600)
+#  seconds between partial tables sent while downloading
+PARTIAL_INTERVAL = 2
+#  milliseconds to wait for further edits of credentials or filters before connecting
+CONNECT_DELAY = 700
 
 
 class OWImportSamples(OWWidget):
@@ -34,19 +42,57 @@ class OWImportSamples(OWWidget):
     want_main_area = False
     resizing_enabled = False
     priority = 1
-    outputs = [("Data", Table)]
+    outputs = [("Data", Table), ("Immunological Data", Table)]
 
     username = settings.Setting('')
     password = settings.Setting('')
     selected_server = settings.Setting(0)
     combo_items = settings.Setting([])
+    incremental_sync = settings.Setting(True)
+    page_size = settings.Setting(PAGE_SIZE)
+    send_partial = settings.Setting(False)
+    workers = settings.Setting(4)
+    filter_village_code = settings.Setting('')
+    filter_study_code = settings.Setting('')
+    filter_entry_date_from = settings.Setting('')
+    filter_entry_date_to = settings.Setting('')
+    refresh_interval = settings.Setting(0)
+    show_stats = settings.Setting(False)
+    http_cache_size = settings.Setting(200)
+    federated = settings.Setting(False)
+    send_long = settings.Setting(False)
+    # Snapshot opened instead of connecting to a server
+    snapshot_path = settings.Setting('')
+    # Credentials [username, password] by server
+    credentials = settings.Setting({})
 
     def __init__(self):
         super().__init__()
         self.res = None
         self.data = None
         self._datatask = None
+        self._checktask = None
         self._executor = ThreadExecutor()
+        # Downloads run one at a time; a new one starts when the cancelled one has stopped
+        self._download_executor = ThreadExecutor(self, threadPool=ThreadPoolExecutor(max_workers=1))
+        # Incremented with each download; signals of superseded downloads are ignored
+        self._generation = 0
+        self._url = None
+        self._cached_version = None
+        # Values of discrete variables from previous loads, kept so that the domain does not change
+        self._values = None
+        self._partial_sent = False
+        # Version of data on the server when last downloaded and hash of the table sent last
+        self._server_version = None
+        self._sent_hash = None
+        self._sent = None
+        self._refresh_timer = QTimer(self, timeout=self.refresh)
+        self._connect_timer = QTimer(self, singleShot=True, interval=CONNECT_DELAY, timeout=self.connect)
+        # Statistics are shown for spans recorded since this mark
+        self._stats_mark = stats.mark()
+        # Downloads from servers and their tables when merging samples from all servers
+        self._sourcetasks = OrderedDict()
+        self._source_tables = OrderedDict()
 
         """Choose server"""
         box = gui.widgetBox(self.controlArea, 'Server')
@@ -65,18 +111,75 @@ class OWImportSamples(OWWidget):
 
         self.pass_field.setEchoMode(QLineEdit.Password)
 
+        """options and filters, in tabs so that the widget is not too tall"""
+        tabs = gui.tabWidget(self.controlArea)
+        tabs.setSizePolicy(Policy.Minimum, Policy.Fixed)
+        box = gui.createTabPage(tabs, 'Download')
+        gui.checkBox(box, self, 'incremental_sync', 'Incremental sync',
+                     tooltip='Keep a local copy of samples and download only the changed ones.')
+        gui.spin(box, self, 'page_size', 50, 10000, step=50, label='Page size:',
+                 tooltip='Number of samples retrieved per request.')
+        gui.spin(box, self, 'workers', 1, MAX_WORKERS, label='Parallel requests:',
+                 tooltip='Number of pages retrieved at the same time.')
+        gui.spin(box, self, 'http_cache_size', 10, 10000, step=10, label='HTTP cache (MB):',
+                 tooltip='Largest size of cached responses; least recently used ones are removed first.',
+                 callback=self.on_http_cache_size_changed)
+        gui.spin(box, self, 'refresh_interval', 0, 1440, label='Refresh every (min):',
+                 tooltip='Check the server for changes at this interval (0 disables refreshing).',
+                 callback=self.on_refresh_interval_changed)
+        gui.rubber(box)
+
+        box = gui.createTabPage(tabs, 'Output')
+        gui.checkBox(box, self, 'send_partial', 'Send partial data while downloading')
+        gui.checkBox(box, self, 'send_long', 'Send immunological data in long form',
+                     tooltip='Send a table with a row per antigen measurement of a sample.',
+                     callback=self.send_immunology)
+        gui.checkBox(box, self, 'federated', 'Merge samples from all servers',
+                     tooltip='Download from all servers with stored credentials at the same time.',
+                     callback=self.connect)
+        gui.rubber(box)
+
+        box = gui.createTabPage(tabs, 'Filters')
+        for name, label in (('village_code', 'Village code:'), ('study_code', 'Study code:'),
+                            ('entry_date_from', 'Entry date from:'), ('entry_date_to', 'Entry date to:')):
+            field = gui.lineEdit(box, self, 'filter_' + name, label, labelWidth=100, controlWidth=200,
+                                 orientation='horizontal', callback=self.on_filters_changed)
+            if name.startswith('entry_date'):
+                field.setPlaceholderText('YYYY-MM-DD')
+        gui.rubber(box)
+
+        """snapshots"""
+        box = gui.hBox(self.controlArea, 'Snapshot')
+        box.setSizePolicy(Policy.Minimum, Policy.Fixed)
+        gui.button(box, self, 'Open...', callback=self.open_snapshot, autoDefault=False,
+                   tooltip='Load samples from a snapshot file instead of a server.')
+        gui.button(box, self, 'Save...', callback=self.export_snapshot, autoDefault=False,
+                   tooltip='Save the loaded samples to a snapshot file.')
+
         """display info"""
         box = gui.vBox(self.controlArea, "Info")
         box.setSizePolicy(Policy.Minimum, Policy.Fixed)
         self.info = gui.widgetLabel(box, 'No data loaded.')
+        gui.checkBox(box, self, 'show_stats', 'Show statistics', callback=self._update_stats)
+        self.stats_label = gui.widgetLabel(box, '')
+        self._update_stats()
 
         gui.rubber(self.controlArea)
         self.auth_set()
+        self.on_refresh_interval_changed()
 
-        if self.username and self.password:
+        if self.snapshot_path:
+            self.open_snapshot_file(self.snapshot_path)
+        elif self.username and self.password:
             self.connect()
 
-    def _on_exception(self):
+    def _on_exception(self, error):
+        self.progressBarFinished()
+        self._handle_inputs(True)
+        self._update_stats()
+        if getattr(error, 'response', None) is not None and error.response.status_code in (401, 403):
+            # Session has expired on the server
+            sessions.invalidate(self._url, self.username)
         self._update_info(error_msg='Error while downloading data...\n'
                                     'Please check your connection.')
 
@@ -92,6 +195,18 @@ class OWImportSamples(OWWidget):
         else:
             self.info.setText(error_msg)
 
+    def _update_stats(self):
+        lines = [format_summary(stats.summary(self._stats_mark)) or 'No statistics.']
+        http_cache = get_http_cache(create=False)
+        if http_cache is not None:
+            info = http_cache.info()
+            lines.append('HTTP cache: {} responses, {:.1f} of {:.0f} MB ({} hits, {} misses, {} evicted)'.format(
+                info['entries'], info['size'] / 2 ** 20, info['max_size'] / 2 ** 20,
+                info['hits'], info['misses'], info['evictions']))
+        self.stats_label.setText('\n'.join(lines))
+        self.stats_label.setVisible(self.show_stats)
+        self.adjustSize()
+
     def _handle_inputs(self, enable):
         self.name_field.setEnabled(enable)
         self.pass_field.setEnabled(enable)
@@ -118,6 +233,10 @@ class OWImportSamples(OWWidget):
         self.servers.setStyleSheet('')
 
     def on_server_changed(self):
+        url = self.servers.itemText(self.selected_server)
+        if url in self.credentials:
+            self.username, self.password = self.credentials[url]
+            self.auth_set()
         if self.servers.itemText(self.selected_server) != '':
             if self.username and self.password:
                 self.connect()
@@ -138,27 +257,161 @@ class OWImportSamples(OWWidget):
             self._handle_styles(server=True)
         else:
             self._reset_styles()
-            self.connect()
+            self._connect_timer.start()
+
+    def filters(self):
+        return {name: getattr(self, 'filter_' + name).strip() for name in FILTERS}
+
+    def on_filters_changed(self):
+        if self.username and self.password and self.servers.itemText(self.selected_server) != '':
+            self._connect_timer.start()
+
+    def on_http_cache_size_changed(self):
+        http_cache = get_http_cache(create=False)
+        if http_cache is not None:
+            http_cache.max_size = self.http_cache_size * 2 ** 20
+
+    def on_refresh_interval_changed(self):
+        if self.refresh_interval:
+            self._refresh_timer.start(self.refresh_interval * 60 * 1000)
+        else:
+            self._refresh_timer.stop()
+
+    def refresh(self):
+        """Check the server for changes (in background) and download data if there are any."""
+        if self.snapshot_path:
+            return
+        if self.federated:
+            # Each source checks its server and takes unchanged data from the table cache
+            if not self._sourcetasks:
+                self.start_federated()
+            return
+        if self.res is None or self._datatask is not None or self._checktask is not None:
+            return
+        self._stats_mark = stats.mark()
+        self._checktask = CheckTask(self.res, self.filters())
+        self._checktask.finished.connect(self.on_checked)
+        self._executor.submit(self._checktask)
+
+    def on_checked(self):
+        task, self._checktask = self._checktask, None
+        try:
+            version = task.result()
+        except Exception:  # connection problems are reported when downloading
+            return
+        if version != self._server_version and self.res is not None and self._datatask is None:
+            self.start_download()
+
+    def load_cached(self):
+        """Send the table stored last for the selected server, if any."""
+        cached = table_cache.load_latest(self._url, latest_schema(self._url))
+        if cached:
+            self._cached_version, table = cached
+            self._values = discrete_values(table.domain)
+            self.info.setText('Cached data: {} samples.'.format(len(table)))
+            self._sent_hash = content_hash(table)
+            self.send_data(table)
+
+    def send_data(self, table):
+        self._sent = table
+        self.send("Data", table)
+        self.send_immunology()
+
+    def send_immunology(self):
+        """Send measurements of the table sent last in long form (if enabled)."""
+        if self.send_long and self._sent is not None:
+            self.send("Immunological Data", to_long(self._sent))
+        else:
+            self.send("Immunological Data", None)
+
+    def on_partial(self, table):
+        self._partial_sent = True
+        self._sent_hash = None
+        self.info.setText('Retrieving data: {} samples so far...'.format(len(table)))
+        self.send_data(table)
+
+    def _if_current(self, generation, slot, *args):
+        """Call slot with args if download `generation` is the current one."""
+        if generation == self._generation:
+            slot(*args)
+
+    def cancel_download(self):
+        """Stop the running download (if any) and ignore its results."""
+        if self._datatask is not None:
+            self._datatask.cancel()
+            self._datatask = None
+            self.progressBarFinished()
+        self._generation += 1
 
     def commit(self):
-        self.data = self._datatask.result()
-        self._datatask = None
+        task, self._datatask = self._datatask, None
+        try:
+            result = task.result()
+        except Exception as e:
+            self._on_exception(e)
+            return
+        self.progressBarFinished()
+        if result:
+            version, self.data, malformed_dates = result
+            self._server_version = version
+            self._values = discrete_values(self.data.domain)
+            malformed = ', '.join('{} ({})'.format(name, n) for name, n in malformed_dates.items() if n)
+            flagged = format_report(self.data.attributes.get(REPORT, {}))
+            warnings = []
+            if malformed:
+                warnings.append('Malformed dates ignored: {}.'.format(malformed))
+            if flagged:
+                warnings.append('Flagged samples: {}.'.format(flagged))
+            if warnings:
+                self.warning(' '.join(warnings))
+            else:
+                self.warning()
+            version = '{} {}'.format(version, sorted(self.filters().items()))
+            if version != self._cached_version or self._partial_sent:
+                table_cache.save(self._url, self.res.schema, version, self.data)
+                self._cached_version = version
+                content = content_hash(self.data)
+                if content != self._sent_hash:
+                    self._sent_hash = content
+                    self.send_data(self.data)
         self._update_info()
-        if self.data:
-            self.send("Data", to_orange_table(self.data))
+        self._update_stats()
 
     def connect(self):
+        self._connect_timer.stop()
+        self.cancel_download()
         self.res = None
         self.data = None
+        self.snapshot_path = ''
 
         if self.username and self.password:
             self._reset_styles()
+            self._stats_mark = stats.mark()
             """Store widget settings (Login)"""
             self.combo_items = [self.servers.itemText(i) for i in range(self.servers.count())]
             self.selected_server = self.servers.currentIndex()
 
+            url = self.servers.itemText(self.selected_server)
+            if url:
+                self.credentials[url] = [self.username, self.password]
+            self._cancel_sources()
+            if self.federated:
+                self._url = None
+                self.start_federated()
+                return
+
+            if url != self._url:
+                self._url = url
+                self._cached_version = None
+                self._server_version = None
+                self._sent_hash = None
+                self._values = None
+                self.load_cached()
+
             try:
-                self.res = ResolweAPI(self.username, self.password, self.servers.itemText(self.selected_server))
+                cache = get_http_cache()
+                cache.max_size = self.http_cache_size * 2 ** 20
+                self.res = sessions.get(self.username, self.password, url, cache)
             except (ResolweCredentialsException, ResolweServerException, Exception) as e:
                 error_name = type(e).__name__
 
@@ -172,26 +425,238 @@ class OWImportSamples(OWWidget):
                     self._update_info(error_msg=str(e))
 
             if self.res:
-                self._datatask = DownloadTask(self.res)
-                self._datatask.finished.connect(self.commit)
-                self._datatask.exception.connect(self._on_exception)
-                self._executor.submit(self._datatask)
-                self._update_info()
+                self.start_download()
+
+    def start_download(self):
+        self.cancel_download()
+        generation = self._generation
+        snapshot = snapshot_file(self._url, self.username) if self.incremental_sync else None
+        self._datatask = DownloadTask(self.res, snapshot, self.page_size, self.workers,
+                                      PARTIAL_INTERVAL if self.send_partial else None, self.filters(), self._values)
+        self._datatask.finished.connect(partial(self._if_current, generation, self.commit))
+        self._datatask.exception.connect(partial(self._if_current, generation, self._on_exception))
+        self._datatask.progress.connect(partial(self._if_current, generation, self.progressBarSet))
+        self._datatask.partial.connect(partial(self._if_current, generation, self.on_partial))
+        self._partial_sent = False
+        self.progressBarInit()
+        self._download_executor.submit(self._datatask)
+        self._update_info()
+
+    def open_snapshot(self):
+        path, _ = QFileDialog.getOpenFileName(self, 'Open Snapshot', os.path.dirname(self.snapshot_path),
+                                              'Sample snapshots (*{})'.format(EXTENSION))
+        if path:
+            self.open_snapshot_file(path)
+
+    def open_snapshot_file(self, path):
+        """Send samples from snapshot at `path` instead of those from the server."""
+        self._connect_timer.stop()
+        self.cancel_download()
+        self._cancel_sources()
+        try:
+            table, info = load_snapshot(path)
+        except (OSError, ValueError) as e:
+            self.error('Could not open snapshot: {}'.format(e))
+            return
+        self.error()
+        self.res = None
+        self._url = None
+        self.snapshot_path = path
+        self.data = table
+        self._values = discrete_values(table.domain)
+        self._sent_hash = content_hash(table)
+        self.send_data(table)
+        self.info.setText('Snapshot of {} from {}: {} samples.'.format(
+            info.get('url') or 'unknown server', info.get('created') or 'unknown date', len(table)))
+
+    def export_snapshot(self):
+        if self._sent is None:
+            return
+        path, _ = QFileDialog.getSaveFileName(self, 'Save Snapshot', os.path.dirname(self.snapshot_path),
+                                              'Sample snapshots (*{})'.format(EXTENSION))
+        if not path:
+            return
+        if not path.endswith(EXTENSION):
+            path += EXTENSION
+        try:
+            save_snapshot(path, self._sent, url=self._url or ', '.join(self._source_tables),
+                          version=self._server_version, filters=self.filters(),
+                          created=datetime.datetime.now().isoformat(timespec='seconds'))
+        except OSError as e:
+            self.error('Could not save snapshot: {}'.format(e))
+        else:
+            self.error()
+
+    def sources(self):
+        """Return url, username and password of servers with stored credentials."""
+        return [(url, ) + tuple(self.credentials[url]) for url in self.combo_items
+                if url and all(self.credentials.get(url, ('', '')))]
+
+    def start_federated(self):
+        """Download samples from all servers with stored credentials at the same time."""
+        self._cancel_sources()
+        self._stats_mark = stats.mark()
+        self._source_tables = OrderedDict()
+        cache = get_http_cache()
+        cache.max_size = self.http_cache_size * 2 ** 20
+        for url, username, password in self.sources():
+            task = SourceTask(url, username, password, cache,
+                              snapshot_file(url, username) if self.incremental_sync else None,
+                              self.page_size, self.workers, filters=self.filters(), values=self._values)
+            task.finished.connect(partial(self.on_source_finished, url, task))
+            task.progress.connect(self.on_source_progress)
+            self._sourcetasks[url] = task
+            self._source_tables[url] = None
+        if not self._sourcetasks:
+            self.info.setText('No servers with credentials.')
+            return
+        self.progressBarInit()
+        for task in self._sourcetasks.values():
+            self._executor.submit(task)
+        self.info.setText('Retrieving data from {} servers...'.format(len(self._sourcetasks)))
+
+    def _cancel_sources(self):
+        for task in self._sourcetasks.values():
+            task.cancel()
+        self._sourcetasks = OrderedDict()
+
+    def on_source_progress(self):
+        self.progressBarSet(sum(task.done for task in self._sourcetasks.values()) /
+                            max(sum(task.count for task in self._sourcetasks.values()), 1) * 100)
+
+    def on_source_finished(self, url, task):
+        if self._sourcetasks.get(url) is not task:  # cancelled
+            return
+        del self._sourcetasks[url]
+        try:
+            result = task.result()
+        except Exception:
+            result = None
+        if result:
+            version, table, _ = result
+            if not task.cached:
+                table_cache.save(url, task.res.schema, '{} {}'.format(version, sorted(self.filters().items())), table)
+            self._source_tables[url] = table
+        if not self._sourcetasks:
+            self.commit_federated()
+
+    def commit_federated(self):
+        """Merge tables from servers and send the merged table."""
+        self.progressBarFinished()
+        tables = [(url, table) for url, table in self._source_tables.items() if table is not None]
+        failed = [url for url, table in self._source_tables.items() if table is None]
+        if failed:
+            self.warning('Could not retrieve data from: {}.'.format(', '.join(failed)))
+        else:
+            self.warning()
+        if tables:
+            self.data = merge_tables(tables)
+            self._values = discrete_values(self.data.domain)
+            content = content_hash(self.data)
+            if content != self._sent_hash:
+                self._sent_hash = content
+                self.send_data(self.data)
+            self.info.setText('Data ready: {} samples from {} servers ({} duplicates removed).'.format(
+                len(self.data), len(tables), sum(len(table) for _, table in tables) - len(self.data)))
+        else:
+            self.info.setText('Error while downloading data...\nPlease check your connection.')
+        self._update_stats()
 
     def onDeleteWidget(self):
         super().onDeleteWidget()
+        self._refresh_timer.stop()
+        self._connect_timer.stop()
+        self.cancel_download()
+        self._cancel_sources()
         self._executor.shutdown(wait=False)
+        # Cancelled downloads stop in the background after the pages being retrieved
+        self._download_executor.shutdown(wait=False)
+
+
+class CheckTask(Task):
+    """Retrieve version of data on the server."""
+
+    def __init__(self, res, filters=None):
+        super().__init__()
+        self.res = res
+        self.filters = filters
+
+    def run(self):
+        return self.res.get_data_version(self.filters)
 
 
 class DownloadTask(Task):
     exception = pyqtSignal(Exception)
+    progress = pyqtSignal(float)
+    partial = pyqtSignal(object)
 
-    def __init__(self, res):
+    def __init__(self, res, snapshot_file=None, page_size=PAGE_SIZE, workers=1, partial_interval=None,
+                 filters=None, values=None):
         super().__init__()
         self.res = res
+        self.snapshot_file = snapshot_file
+        self.page_size = page_size
+        self.workers = workers
+        self.partial_interval = partial_interval
+        self.filters = filters or {}
+        self.values = values
+        # Numbers of retrieved and of all samples
+        self.done = self.count = 0
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        """Stop retrieving pages."""
+        self._cancelled.set()
+
+    def run(self):
+        """Download samples page by page and convert them to a table as they arrive.
+
+        Return data version, the table and numbers of malformed dates per column.
+        """
+        import requests  # loaded with the session when connecting
+
+        last_partial = time.monotonic()
+
+        def on_page(done, count, builder):
+            nonlocal last_partial
+            self.done, self.count = done, count
+            self.progress.emit(100 * done / max(count, 1))
+            if self.partial_interval and time.monotonic() - last_partial >= self.partial_interval:
+                self.partial.emit(builder.table())
+                last_partial = time.monotonic()
+
+        try:
+            return download.download(self.res, self.snapshot_file, self.page_size, self.workers, self.filters,
+                                     self.values, self._cancelled, on_page)
+        except requests.exceptions.RequestException as e:
+            self.exception.emit(e)
+
+
+class SourceTask(DownloadTask):
+    """Log in to one of the servers and download its samples.
+
+    If the data on the server has not changed since its table was stored in
+    the table cache, the stored table is returned instead (and `cached` is set).
+    """
+
+    def __init__(self, url, username, password, http_cache=None, *args, **kwargs):
+        super().__init__(None, *args, **kwargs)
+        self.url = url
+        self.username = username
+        self.password = password
+        self.http_cache = http_cache
+        self.cached = False
 
     def run(self):
         try:
-            return list(self.res.get_samples())
-        except requests.exceptions.ConnectionError as e:
+            self.res = sessions.get(self.username, self.password, self.url, self.http_cache)
+        except Exception as e:  # wrong credentials or server
             self.exception.emit(e)
+            return
+        version = self.res.get_data_version(self.filters)
+        table = table_cache.load(self.url, download.session_schema(self.res),
+                                 '{} {}'.format(version, sorted(self.filters.items())))
+        if table is not None:
+            self.cached = True
+            return version, table, {}
+        return super().run()
@@ -35,12 +35,21 @@ DATA_FILES = [
 
 INSTALL_REQUIRES = [
     'Orange3',
+    'numpy',
     'resdk',
     "requests>=2.11.1",
-    "requests-cache>=0.4.12",
 ]
 
+EXTRAS_REQUIRE = {
+    # Faster decoding of samples' JSON and brotli-compressed responses
+    'fast': ['orjson', 'brotli'],
+}
+
 ENTRY_POINTS = {
+    # Export of samples without GUI
+    'console_scripts': (
+        'orange-vaccinesurvey-export = orangecontrib.vaccinesurvey.export:main',
+    ),
     # Entry points that marks this package as an orange add-on. If set, addon will
     # be shown in the add-ons manager even if not published on PyPi.
     'orange3.addon': (
@@ -92,6 +101,7 @@ if __name__ == '__main__':
         package_data=PACKAGE_DATA,
         data_files=DATA_FILES,
         install_requires=INSTALL_REQUIRES,
+        extras_require=EXTRAS_REQUIRE,
         entry_points=ENTRY_POINTS,
         keywords=KEYWORDS,
         namespace_packages=NAMESPACE_PACKAGES,